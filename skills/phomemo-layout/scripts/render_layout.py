@@ -44,8 +44,10 @@ def main() -> int:
 
     pipeline = LayoutJobPipeline()
     try:
-        result = pipeline.run(
-            job_config_path=args.json_path,
+        config = json.loads(args.json_path.read_text(encoding="utf-8"))
+        result = pipeline.run_config(
+            config,
+            base_dir=args.json_path.parent,
             printer_address=None,
             printer_channel=1,
             encoding=args.encoding,
@@ -66,6 +68,8 @@ def main() -> int:
             )
         )
         return 1
+    finally:
+        pipeline.close()
 
     payload = {
         "preview_path": str(result.preview_path or ""),
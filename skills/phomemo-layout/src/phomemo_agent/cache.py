@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """
+    スレッドセーフなLRUキャッシュ。ヒット/ミス数を記録する。
+    - maxsize: 件数上限
+    - max_bytes + sizeof: 値のバイト数合計の上限（画像など大きな値向け）
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[V], int]] = None,
+    ) -> None:
+        if maxsize is None and max_bytes is None:
+            raise ValueError("maxsize か max_bytes のどちらかを指定してください。")
+        if maxsize is not None and maxsize <= 0:
+            raise ValueError("maxsizeは1以上で指定してください。")
+        if max_bytes is not None and (max_bytes <= 0 or sizeof is None):
+            raise ValueError("max_bytesは1以上とし、sizeofを指定してください。")
+        self.maxsize = int(maxsize) if maxsize is not None else None
+        self.max_bytes = int(max_bytes) if max_bytes is not None else None
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self._data: "OrderedDict[Hashable, V]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: V) -> None:
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                # 予算を超える値は保持しない
+                return
+            self.current_bytes += size - self._sizes.get(key, 0)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._data.move_to_end(key)
+            while self._over_budget():
+                evicted, _ = self._data.popitem(last=False)
+                self.current_bytes -= self._sizes.pop(evicted, 0)
+                self.evictions += 1
+
+    def _over_budget(self) -> bool:
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            return True
+        return self.max_bytes is not None and self.current_bytes > self.max_bytes
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], V]) -> V:
+        value = self.get(key)
+        if value is None:
+            # 生成はロック外で行う（重い処理で他スレッドを止めないため）
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+            if self.max_bytes is not None:
+                stats["bytes"] = self.current_bytes
+                stats["max_bytes"] = self.max_bytes
+            return stats
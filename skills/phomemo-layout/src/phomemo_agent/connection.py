@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .constants import DEFAULT_IDLE_TIMEOUT
+from .loopback import LoopbackPrinter, is_loopback_address
+
+PrinterKey = Tuple[str, int]
+
+
+class PrinterIOError(OSError):
+    """プリンタへの接続・書き込みの失敗（ジョブの内容ではなく、プリンタや回線の問題）。"""
+
+
+def open_printer(address: str, channel: int):
+    if is_loopback_address(address):
+        # 実機なしで送信内容・スループットを確かめるための代用品
+        return LoopbackPrinter(address, channel)
+
+    from phomemo_printer.ESCPOS_printer import Printer
+
+    return Printer(address, channel)
+
+
+def is_printer_healthy(printer) -> bool:
+    """
+    RFCOMMソケットが再利用できる状態かを確認する。
+    読み取り可能なのに0バイトしか読めない場合は、相手側から切断されている。
+    """
+    sock = getattr(printer, "s", None)
+    if sock is None:
+        return True
+    try:
+        if sock.fileno() == -1:
+            return False
+        readable, _, errored = select.select([sock], [], [sock], 0)
+        if errored:
+            return False
+        if readable:
+            return bool(sock.recv(1, socket.MSG_PEEK))
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+@dataclass
+class _Connection:
+    printer: object
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class PrinterConnectionPool:
+    """
+    (address, channel) ごとにプリンタ接続を保持し、ジョブ間で再利用する。
+    - 再利用前にヘルスチェックを行い、切断されていれば張り直す
+    - 送信中に例外が出た接続は破棄し、次回は新しく接続する
+    - idle_timeout 秒使われなかった接続は閉じる（0 なら使用後すぐ閉じる）
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        factory: Callable[[str, int], object] = open_printer,
+    ) -> None:
+        self.idle_timeout = float(idle_timeout)
+        self.factory = factory
+        self._connections: Dict[PrinterKey, _Connection] = {}
+        self._key_locks: Dict[PrinterKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.connects = 0
+        self.reuses = 0
+
+    @contextmanager
+    def acquire(self, address: str, channel: int) -> Iterator[object]:
+        """
+        接続を借りる。同じ (address, channel) は同時に1ジョブしか使えない。
+        """
+        key = (address, int(channel))
+        with self._key_lock(key):
+            printer = self._checkout(key)
+            try:
+                yield printer
+            except BaseException:
+                self._discard(key)
+                raise
+            self._release(key)
+
+    def close_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            keys = [
+                key
+                for key, conn in self._connections.items()
+                if now - conn.last_used >= self.idle_timeout
+            ]
+        for key in keys:
+            lock = self._key_lock(key)
+            # 使用中の接続は次の周期で判定する
+            if lock.acquire(blocking=False):
+                try:
+                    conn = self._connections.get(key)
+                    if conn is not None and now - conn.last_used >= self.idle_timeout:
+                        self._discard(key)
+                finally:
+                    lock.release()
+
+    def close_all(self) -> None:
+        self._stop.set()
+        with self._lock:
+            keys = list(self._connections)
+        for key in keys:
+            with self._key_lock(key):
+                self._discard(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            open_count = len(self._connections)
+        return {
+            "open": open_count,
+            "connects": self.connects,
+            "reuses": self.reuses,
+            "idle_timeout": self.idle_timeout,
+        }
+
+    def _key_lock(self, key: PrinterKey) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _checkout(self, key: PrinterKey) -> object:
+        conn = self._connections.get(key)
+        if conn is not None:
+            if is_printer_healthy(conn.printer):
+                self.reuses += 1
+                return conn.printer
+            self._discard(key)
+
+        try:
+            printer = self.factory(*key)
+        except OSError as exc:
+            raise PrinterIOError(*exc.args) from exc
+        self.connects += 1
+        with self._lock:
+            self._connections[key] = _Connection(printer)
+        return printer
+
+    def _release(self, key: PrinterKey) -> None:
+        if self.idle_timeout <= 0:
+            self._discard(key)
+            return
+        conn = self._connections.get(key)
+        if conn is not None:
+            conn.last_used = time.monotonic()
+        self._ensure_reaper()
+
+    def _discard(self, key: PrinterKey) -> None:
+        with self._lock:
+            conn = self._connections.pop(key, None)
+        if conn is None:
+            return
+        try:
+            conn.printer.close()
+        except OSError:
+            pass
+
+    def _ensure_reaper(self) -> None:
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop.clear()
+            self._reaper = threading.Thread(
+                target=self._reap_loop, name="phomemo-connection-reaper", daemon=True
+            )
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        interval = max(1.0, self.idle_timeout / 2)
+        while not self._stop.wait(interval):
+            self.close_idle()
+            with self._lock:
+                if not self._connections:
+                    self._reaper = None
+                    return
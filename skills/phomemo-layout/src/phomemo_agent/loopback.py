@@ -0,0 +1,236 @@
+"""
+実機の代わりに使うループバックプリンタ（アドレス "loopback://..." で選ばれる）。
+受け取ったバイト列を記録し、ESC/POS を画像に復元できる。回線帯域・遅延・受信バッファ詰まりも再現する。
+
+    loopback://bench?bandwidth=20000&latency=0.01&buffer=4096&drain=8000
+
+- bandwidth: 回線速度 (bytes/sec)。省略時は無制限
+- latency: 書き込み1回ごとの遅延 (秒)
+- buffer: プリンタの受信バッファ (bytes)。drain（印字で消費される速度 bytes/sec）と組で使う
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import Image
+
+from phomemo_printer.ESCPOS_constants import FOOTER, GSV0, HEADER, PRINT_FEED
+
+from .constants import CANVAS_WIDTH
+from .raster import FEED_DOTS, encode_image
+
+LOOPBACK_SCHEME = "loopback://"
+
+# 開いているループバックプリンタ（アドレスごと）。close で外す。
+_PRINTERS: Dict[str, "LoopbackPrinter"] = {}
+# 閉じた後も記録を参照できるよう、直近に閉じたものを LOOPBACK_HISTORY 件（アドレスごとに1件）だけ残す
+_CLOSED: "OrderedDict[str, LoopbackPrinter]" = OrderedDict()
+_PRINTERS_LOCK = threading.Lock()
+LOOPBACK_HISTORY = 8
+
+
+def is_loopback_address(address: Optional[str]) -> bool:
+    return bool(address) and str(address).startswith(LOOPBACK_SCHEME)
+
+
+def get_loopback_printer(address: str) -> Optional["LoopbackPrinter"]:
+    """開いているもの、無ければ直近に閉じたもの（LOOPBACK_HISTORY 件まで）を返す。"""
+    with _PRINTERS_LOCK:
+        printer = _PRINTERS.get(address)
+        return printer if printer is not None else _CLOSED.get(address)
+
+
+def clear_loopback_printers() -> None:
+    """記録を全て捨てる（テストやベンチマークの区切りに使う）。開いているプリンタは引き続き使える。"""
+    with _PRINTERS_LOCK:
+        _PRINTERS.clear()
+        _CLOSED.clear()
+
+
+def _query_float(query: Dict[str, List[str]], name: str) -> Optional[float]:
+    values = query.get(name)
+    if not values:
+        return None
+    try:
+        return float(values[-1])
+    except ValueError:
+        raise ValueError(f"loopbackアドレスの {name} は数値で指定してください: {values[-1]}") from None
+
+
+class LoopbackPrinter:
+    """
+    phomemo_printer の Printer と同じ _print_bytes / close を持つ。
+    s を持たないため、接続プールのヘルスチェックは常に成功する。
+    """
+
+    def __init__(
+        self,
+        address: str = LOOPBACK_SCHEME,
+        channel: int = 1,
+        bandwidth: Optional[float] = None,
+        latency: float = 0.0,
+        receive_buffer: Optional[int] = None,
+        drain_rate: Optional[float] = None,
+    ) -> None:
+        query = parse_qs(urlsplit(address).query)
+        bandwidth = bandwidth if bandwidth is not None else _query_float(query, "bandwidth")
+        latency = latency or _query_float(query, "latency") or 0.0
+        buffer_size = receive_buffer if receive_buffer is not None else _query_float(query, "buffer")
+        drain_rate = drain_rate if drain_rate is not None else _query_float(query, "drain")
+        if bandwidth is not None and bandwidth <= 0:
+            raise ValueError("bandwidthは正の値で指定してください。")
+        if latency < 0:
+            raise ValueError("latencyは0以上で指定してください。")
+        if (buffer_size is None) != (drain_rate is None) or (
+            buffer_size is not None and (buffer_size <= 0 or drain_rate <= 0)
+        ):
+            raise ValueError("bufferとdrainは正の値で、両方指定してください。")
+
+        self.address = address
+        self.channel = int(channel)
+        self.bandwidth = bandwidth
+        self.latency = float(latency)
+        self.receive_buffer = int(buffer_size) if buffer_size is not None else None
+        self.drain_rate = drain_rate
+        self.data = bytearray()
+        self.writes = 0
+        self.stalls = 0
+        self.stall_sec = 0.0
+        self.closed = False
+        self._level = 0.0
+        self._level_at = time.perf_counter()
+        with _PRINTERS_LOCK:
+            _PRINTERS[address] = self
+
+    def _print_bytes(self, data: bytes) -> None:
+        if self.closed:
+            raise OSError("loopback printer is closed")
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.bandwidth is not None:
+            time.sleep(len(data) / self.bandwidth)
+        if self.receive_buffer is not None:
+            self._fill_buffer(len(data))
+        self.data += data
+        self.writes += 1
+
+    def _fill_buffer(self, size: int) -> None:
+        # 受信バッファは drain_rate で印字に消費される。溢れる分は空くまで待たされる（stall）
+        now = time.perf_counter()
+        self._level = max(0.0, self._level - (now - self._level_at) * self.drain_rate)
+        overflow = self._level + min(size, self.receive_buffer) - self.receive_buffer
+        if overflow > 0:
+            wait = overflow / self.drain_rate
+            self.stalls += 1
+            self.stall_sec += wait
+            time.sleep(wait)
+            now = time.perf_counter()
+            self._level = max(0.0, self._level - wait * self.drain_rate)
+        self._level = min(float(self.receive_buffer), self._level + size)
+        self._level_at = now
+
+    def close(self) -> None:
+        self.closed = True
+        with _PRINTERS_LOCK:
+            if _PRINTERS.get(self.address) is self:
+                del _PRINTERS[self.address]
+                _CLOSED.pop(self.address, None)
+                _CLOSED[self.address] = self
+                while len(_CLOSED) > LOOPBACK_HISTORY:
+                    _CLOSED.popitem(last=False)
+
+    def decode(self) -> "DecodedPrint":
+        return decode_escpos(bytes(self.data))
+
+    def stats(self) -> Dict:
+        return {
+            "bytes": len(self.data),
+            "writes": self.writes,
+            "stalls": self.stalls,
+            "stall_sec": round(self.stall_sec, 6),
+            "bandwidth": self.bandwidth,
+            "latency": self.latency,
+            "receive_buffer": self.receive_buffer,
+            "drain_rate": self.drain_rate,
+        }
+
+
+@dataclass
+class DecodedPrint:
+    image: Image.Image
+    header: int = 0
+    footer: int = 0
+    blocks: int = 0
+    feed_rows: int = 0
+    print_feeds: int = 0
+    unknown_bytes: int = 0
+    block_heights: List[int] = field(default_factory=list)
+
+
+def decode_escpos(data: bytes, width: int = CANVAS_WIDTH) -> DecodedPrint:
+    """
+    transmit が送るバイト列（HEADER / GS v 0 / ESC J / PRINT_FEED / FOOTER）を mode "1" 画像に戻す。
+    GS v 0 の高さは phomemo_printer 互換で「実際の行数-1」が入っている前提で読む。
+    PRINT_FEED（ESC d）は行数が機種依存のため画像には含めず、回数だけ数える。
+    """
+    width_bytes = width // 8
+    rows: List[np.ndarray] = []
+    decoded = DecodedPrint(image=Image.new("1", (width, 0), 1))
+    pos = 0
+    while pos < len(data):
+        if data.startswith(HEADER, pos):
+            decoded.header += 1
+            pos += len(HEADER)
+        elif data.startswith(FOOTER, pos):
+            decoded.footer += 1
+            pos += len(FOOTER)
+        elif data.startswith(PRINT_FEED, pos):
+            decoded.print_feeds += 1
+            pos += len(PRINT_FEED)
+        elif data.startswith(GSV0, pos) and pos + 8 <= len(data):
+            block_width = data[pos + 4] + data[pos + 5] * 256
+            block_height = data[pos + 6] + data[pos + 7] * 256 + 1
+            if block_width != width_bytes:
+                raise ValueError(f"GS v 0 の幅が{width_bytes}バイトではありません: {block_width}")
+            pos += 8
+            payload = data[pos : pos + block_width * block_height]
+            if len(payload) != block_width * block_height:
+                raise ValueError("GS v 0 のデータが途中で切れています。")
+            rows.append(np.frombuffer(payload, dtype=np.uint8).reshape(block_height, block_width))
+            decoded.blocks += 1
+            decoded.block_heights.append(block_height)
+            pos += len(payload)
+        elif data.startswith(FEED_DOTS, pos) and pos + 3 <= len(data):
+            feed = data[pos + 2]
+            rows.append(np.zeros((feed, width_bytes), dtype=np.uint8))
+            decoded.feed_rows += feed
+            pos += 3
+        else:
+            decoded.unknown_bytes += 1
+            pos += 1
+
+    if rows:
+        packed = np.concatenate(rows)
+        # 1=黒 を mode "1"（1=白）に戻す
+        decoded.image = Image.frombytes("1", (width, packed.shape[0]), (~packed).tobytes())
+    return decoded
+
+
+def raster_mismatch_rows(decoded: Image.Image, expected: Image.Image) -> int:
+    """
+    復元画像と印刷対象の2値画像を比べ、一致しない行数を返す（高さの差も不一致として数える）。
+    0x0A→0x14 の置換は印刷内容そのものなので、期待画像側にも同じ置換を施して比べる。
+    """
+    width_bytes = expected.width // 8
+    actual = np.frombuffer(encode_image(decoded), dtype=np.uint8).reshape(-1, width_bytes)
+    # decoded は置換済みのデータから作られているので、encode_image でも値は変わらない
+    wanted = np.frombuffer(encode_image(expected), dtype=np.uint8).reshape(-1, width_bytes)
+    common = min(len(actual), len(wanted))
+    mismatched = int(np.any(actual[:common] != wanted[:common], axis=1).sum())
+    return mismatched + abs(len(actual) - len(wanted))
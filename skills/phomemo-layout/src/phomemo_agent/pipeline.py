@@ -4,16 +4,98 @@ import json
 from dataclasses import dataclass
 import os
 import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, Mapping, Optional, Sequence, Tuple, Union
 
 from PIL import Image
 
-from .composer import compose_canvas, to_thermal_ready
-from .constants import DEFAULT_CHUNK_ROWS, DEFAULT_SLICE_HEIGHT, DEFAULT_THRESHOLD
-from .printer import transmit
+from .batch import template_fields
+from .binarize import Binarizer
+from .composer import (
+    CanvasPlan,
+    as_mono,
+    cache_stats,
+    iter_canvas_bands,
+    make_preview,
+    materialize,
+    paste_layers,
+    prepare_canvas,
+    slice_image,
+    to_thermal_ready,
+)
+from .connection import PrinterConnectionPool
+from .constants import (
+    CANVAS_WIDTH,
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_IDLE_TIMEOUT,
+    DEFAULT_MIN_BLANK_ROWS,
+    DEFAULT_PREFETCH_JOBS,
+    DEFAULT_PREFETCH_SLICES,
+    MAX_PREFETCH_SLICES,
+    DEFAULT_PREVIEW_WIDTH,
+    DEFAULT_SLICE_HEIGHT,
+    DEFAULT_THRESHOLD,
+    DEFAULT_WRITE_BUFFER_SIZE,
+)
+from .prefetch import prefetch as prefetch_items
+from .printer import BufferedWriter, transmit_slices
+from .raster import PackedRaster
+from .render_cache import RenderCache, render_cache_key
+from .template import CompiledTemplate
+from .timing import JobTimings, TimingHook
 from .validators import LayoutJobValidator
 
+if TYPE_CHECKING:
+    from .render_pool import ProcessRenderPool
+
+
+ProgressCallback = Callable[[str, Dict], None]
+
+_WHITE = {"1": 1, "L": 255, "RGBA": (255, 255, 255, 255)}
+
+
+@dataclass
+class PrinterTarget:
+    address: Optional[str]
+    channel: int
+    address_source: str
+    channel_source: str
+
+
+def resolve_printer_target(
+    printer_address: Optional[str] = None,
+    printer_channel: int = 1,
+) -> PrinterTarget:
+    """
+    引数が無ければ環境変数 (PHOMEMO_PRINTER_ADDRESS / PHOMEMO_PRINTER_CHANNEL) から補う。
+    """
+    address_source = "argument" if printer_address else "env"
+    if printer_address is None:
+        printer_address = os.getenv("PHOMEMO_PRINTER_ADDRESS")
+        if not printer_address:
+            address_source = "missing"
+
+    channel_source = "argument"
+    if (not printer_channel) or printer_channel == 1:
+        # allow overriding default(1) by env var
+        env_channel = os.getenv("PHOMEMO_PRINTER_CHANNEL")
+        if env_channel:
+            try:
+                printer_channel = int(env_channel)
+                channel_source = "env"
+            except ValueError:
+                pass
+
+    return PrinterTarget(
+        address=printer_address,
+        channel=int(printer_channel),
+        address_source=address_source,
+        channel_source=channel_source,
+    )
+
 
 @dataclass
 class LayoutJobResult:
@@ -22,14 +104,77 @@ class LayoutJobResult:
     slice_heights: Optional[list[int]]
     info: Dict
 
+    def to_dict(self) -> Dict:
+        return {
+            "preview_path": str(self.preview_path or ""),
+            "printed": self.printed,
+            "slice_heights": self.slice_heights,
+            "info": self.info,
+        }
+
+
+@dataclass
+class PreparedJob:
+    """合成・2値化まで済んだ送信前のジョブ（LayoutJobPipeline.prepare_config の結果）。"""
+
+    output_cfg: Dict
+    dry_run: bool
+    send_to_printer: bool
+    # 送信する2値スライス（ストリーミング時は送信しながら合成・2値化するジェネレータ。
+    # ワーカープロセスで合成した場合は PackedRaster のまま）
+    slices: Iterable[Union[Image.Image, PackedRaster]]
+    width: int
+    height: int
+    streaming: bool
+    color_mode: Optional[str]
+    preview_path: Optional[Path]
+    preview_future: Optional[Future]
+    # ストリーミング時に送信しながら埋めるプレビュー（送信後に保存する）
+    preview_image: Optional[Image.Image]
+    cache_key: Optional[str]
+    cache_hit: bool
+    cache_source: Optional[str]
+    timings: JobTimings
+    report: ProgressCallback
+    # 印刷する2値画像の全体（ストリーミング時・ワーカープロセスで合成した場合は None）
+    image: Optional[Image.Image] = None
+
 
 class LayoutJobPipeline:
     """
     JSONレイアウトの生成→画像合成→印刷までを一貫して扱う。
     """
 
-    def __init__(self, validator: Optional[LayoutJobValidator] = None) -> None:
+    def __init__(
+        self,
+        validator: Optional[LayoutJobValidator] = None,
+        connection_pool: Optional[PrinterConnectionPool] = None,
+        render_workers: int = 1,
+        timing_hooks: Sequence[TimingHook] = (),
+        render_cache: Optional[RenderCache] = None,
+        render_pool: Optional["ProcessRenderPool"] = None,
+    ) -> None:
         self.validator = validator or LayoutJobValidator()
+        # 段階/レイヤー/スライスの計測値を受け取るフック（トレーシング転送用）
+        self.timing_hooks = list(timing_hooks)
+        # レイヤー描画の並列数（canvas.render_workers で上書き可能）
+        self.render_workers = render_workers
+        # 既定では使用後すぐ閉じる（CLIの1回実行向け）。常駐プロセスでは共有プールを渡す。
+        self.connections = connection_pool or PrinterConnectionPool(idle_timeout=0)
+        # 同じジョブの再印刷で合成・2値化を省くための印刷用ラスタのキャッシュ（既定はメモリのみ）
+        self.render_cache = render_cache if render_cache is not None else RenderCache()
+        # 指定すると prepare_config の検証・合成・2値化を別プロセスで行う（送信はこのプロセス）
+        self.render_pool = render_pool
+        # output.preview_async 用（プレビューPNGのエンコードを送信と並行して行う）
+        self._preview_executor: Optional[ThreadPoolExecutor] = None
+        self._preview_lock = threading.Lock()
+
+    def close(self) -> None:
+        """保存中・保存待ちのプレビューを書き終えてから、プレビュー用のスレッドを止める。"""
+        with self._preview_lock:
+            executor, self._preview_executor = self._preview_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
 
     def run(
         self,
@@ -38,19 +183,93 @@ class LayoutJobPipeline:
         printer_channel: int = 1,
         encoding: str = "utf-8",
         dry_run: bool = False,
+        on_progress: Optional[ProgressCallback] = None,
     ) -> LayoutJobResult:
+        """
+        ジョブJSONファイルを読み込んで実行する。output.path の相対パスはJSONのあるディレクトリ基準。
+        """
         config = json.loads(job_config_path.read_text(encoding="utf-8"))
-        self.validator.validate(config)
+        return self.run_config(
+            config,
+            base_dir=job_config_path.parent,
+            printer_address=printer_address,
+            printer_channel=printer_channel,
+            encoding=encoding,
+            dry_run=dry_run,
+            on_progress=on_progress,
+        )
 
-        composed_image, output_cfg = compose_canvas(config, encoding=encoding)
+    def run_config(
+        self,
+        config: Dict,
+        base_dir: Optional[Path] = None,
+        printer_address: Optional[str] = None,
+        printer_channel: int = 1,
+        encoding: str = "utf-8",
+        dry_run: bool = False,
+        on_progress: Optional[ProgressCallback] = None,
+        validate: bool = True,
+        connection_pool: Optional[PrinterConnectionPool] = None,
+        template: Optional[CompiledTemplate] = None,
+    ) -> LayoutJobResult:
+        """
+        パース済みのジョブ（dict）を実行する。
+        - base_dir: output.path の相対パスの基準（省略時はカレントディレクトリ）
+        - validate: 呼び出し側で検証済みなら False にしてスキーマ検証を省く
+        - connection_pool: この呼び出しだけ別の接続プールを使う（バッチ印刷で接続を保持する場合など）
+        - template: config の元になったコンパイル済みテンプレート（静的レイヤーの描画を使い回す）
+        on_progress には (stage, details) が段階ごと・スライス送信ごとに渡される。
+        コールバック内で例外を投げると、その時点で処理を中断できる。
+        """
+        job = self.prepare_config(
+            config,
+            base_dir=base_dir,
+            encoding=encoding,
+            dry_run=dry_run,
+            on_progress=on_progress,
+            validate=validate,
+            template=template,
+        )
+        return self.deliver(job, printer_address, printer_channel, connection_pool)
 
-        rotate_mode = str(output_cfg.get("rotate", "auto")).lower()
-        composed_image = self._apply_orientation(composed_image, rotate_mode)
+    def prepare_config(
+        self,
+        config: Dict,
+        base_dir: Optional[Path] = None,
+        encoding: str = "utf-8",
+        dry_run: bool = False,
+        on_progress: Optional[ProgressCallback] = None,
+        validate: bool = True,
+        template: Optional[CompiledTemplate] = None,
+    ) -> PreparedJob:
+        """
+        run_config の前半（検証・合成・2値化・プレビュー）。送信は deliver で行う。
+        別スレッドで次のジョブを用意しながら、今のジョブを送信できるように分けてある。
+        """
+        report = on_progress or (lambda stage, details: None)
+        timings = JobTimings(self.timing_hooks)
+
+        # ストリーミングのジョブは全体のラスタを作らずに送るため、ワーカープロセスには回さない
+        streaming_requested = bool(config.get("output", {}).get("streaming", False))
+        if self.render_pool is not None and template is None and not streaming_requested:
+            report("compose", {"process": True})
+            return self.render_pool.prepare(config, base_dir, encoding, dry_run, validate, report, timings)
+
+        report("validate", {})
+        if validate:
+            with timings.stage("validate"):
+                self.validator.validate(config)
 
+        output_cfg = config.get("output", {})
+        rotate_mode = str(output_cfg.get("rotate", "auto")).lower()
         threshold = output_cfg.get("threshold", DEFAULT_THRESHOLD)
+        binarize = str(output_cfg.get("binarize", "threshold")).lower()
         slice_height = output_cfg.get("slice_height", DEFAULT_SLICE_HEIGHT)
-        chunk_rows = output_cfg.get("chunk_rows", DEFAULT_CHUNK_ROWS)
         output_path = output_cfg.get("path")
+        # output.preview: "full"（合成したRGBA） / "bw"（印刷される2値画像） / "thumbnail"（2値画像の縮小版）
+        preview_mode = str(output_cfg.get("preview", "full")).lower()
+        preview_width = int(output_cfg.get("preview_width", DEFAULT_PREVIEW_WIDTH))
+        preview_async = bool(output_cfg.get("preview_async", False))
         send_to_printer = output_cfg.get("send_to_printer", True) and not dry_run
 
         preview_path = None
@@ -60,9 +279,9 @@ class LayoutJobPipeline:
         if output_path or dry_run:
             if output_path:
                 preview_path = Path(output_path)
-                # 相対パスはジョブJSONのあるディレクトリ基準で解決する
+                # 相対パスはジョブJSONのあるディレクトリ（base_dir）基準で解決する
                 if not preview_path.is_absolute():
-                    preview_path = (job_config_path.parent / preview_path)
+                    preview_path = Path(base_dir or Path.cwd()) / preview_path
                 preview_path = preview_path.resolve()
             else:
                 fd, tmp_name = tempfile.mkstemp(prefix="phomemo_preview_", suffix=".png")
@@ -70,73 +289,384 @@ class LayoutJobPipeline:
                 preview_path = Path(tmp_name).resolve()
 
             preview_path.parent.mkdir(parents=True, exist_ok=True)
-            composed_image.save(preview_path, format="PNG")
 
-        bw_image = to_thermal_ready(composed_image, threshold)
-        slice_heights: Optional[list[int]] = None
+        # 同じ内容のジョブは、印刷用の2値ラスタをキャッシュから取り出して合成・2値化を省く。
+        # RGBAのプレビューが要る場合は合成が必要なので使わない
+        cache_key: Optional[str] = None
+        cached: Optional[PackedRaster] = None
+        cache_source: Optional[str] = None
+        if self.render_cache is not None and output_cfg.get("cache", True):
+            with timings.stage("cache"):
+                cache_key = render_cache_key(config, encoding)
+                if preview_path is None or preview_mode != "full":
+                    cached, cache_source = self.render_cache.lookup(cache_key)
 
-        # Printer config from env (if not explicitly provided)
-        printer_address_source = "argument" if printer_address else "env"
-        if printer_address is None:
-            printer_address = os.getenv("PHOMEMO_PRINTER_ADDRESS")
-            if not printer_address:
-                printer_address_source = "missing"
-
-        printer_channel_source = "argument"
-        if (not printer_channel) or printer_channel == 1:
-            # allow overriding default(1) by env var
-            env_channel = os.getenv("PHOMEMO_PRINTER_CHANNEL")
-            if env_channel:
-                try:
-                    printer_channel = int(env_channel)
-                    printer_channel_source = "env"
-                except ValueError:
-                    pass
+        streaming = False
+        color_mode: Optional[str] = None
+        preview_future: Optional[Future] = None
+        preview_image: Optional[Image.Image] = None
+        if cached is not None:
+            bw_image = cached.to_image()
+            width, height = bw_image.width, bw_image.height
+            bw_slices: Iterable[Image.Image] = slice_image(bw_image, slice_height)
+            if preview_path is not None:
+                report("preview", {"path": str(preview_path)})
+                preview_future = self._save_preview(
+                    bw_image, preview_path, preview_mode, preview_width, timings, preview_async
+                )
+        else:
+            report("compose", {})
+            with timings.stage("compose"):
+                if template is not None and template.encoding == encoding:
+                    plan = template.prepare(config)
+                else:
+                    # ストリーミング指定なら、テキストは合成する帯にかかる行だけを後で描く（全体の画像を持たない）
+                    plan = prepare_canvas(
+                        config,
+                        encoding=encoding,
+                        workers=self.render_workers,
+                        banded=bool(output_cfg.get("streaming", False)),
+                    )
+            # output.streaming: slice_height 行ごとに合成→2値化→送信し、全体画像を保持しない。
+            # 回転が必要なジョブは全体画像が要るため通常経路にフォールバックする。
+            orientation_noop = self._orientation_is_noop(plan, rotate_mode)
+            streaming = bool(output_cfg.get("streaming", False)) and orientation_noop
+            if plan.banded and not streaming:
+                with timings.stage("compose"):
+                    plan = materialize(plan)
+            # ストリーミング時のテキストの draw_sec は帯の合成（composite）に含まれ、ここには入らない
+            for index, (layer, rendered) in enumerate(zip(config["layers"], plan.layers)):
+                timings.add_layer(index, str(layer.get("type")), rendered.timings)
+            full_preview = preview_path is not None and preview_mode == "full" and not streaming
+            if plan.mono_eligible and orientation_noop and not full_preview:
+                # 回転・パディングを伴う場合や、RGBAのプレビューPNGを保存する場合は
+                # RGBA合成のアルファが結果に効くため、RGBAのままにする
+                plan = as_mono(plan)
+            color_mode = plan.mode
+            if streaming:
+                report("threshold", {"streaming": True})
+                # 誤差拡散の誤差は帯をまたいで引き継ぐ（全体を一括変換した結果と一致させる）
+                binarizer = Binarizer(threshold, binarize)
+                # 合成・2値化は送信と交互に進むため、要素の生成時間を積算する（transmit の時間にも含まれる）
+                bands = timings.timed_iter("composite", iter_canvas_bands(plan, slice_height))
+                bw_slices = timings.timed_map("threshold", binarizer, bands)
+                width, height = plan.width, plan.height
+                if preview_path is not None:
+                    # ストリーミング時のプレビューは印刷される2値画像（RGBA全体は作らない）
+                    preview_image = Image.new("1", (width, height), 1)
+                    bw_slices = self._collect_preview(bw_slices, preview_image)
+            elif full_preview:
+                with timings.stage("composite"):
+                    composed_image = self._apply_orientation(paste_layers(plan), rotate_mode)
+                report("preview", {"path": str(preview_path)})
+                preview_future = self._save_preview(
+                    composed_image, preview_path, "full", preview_width, timings, preview_async
+                )
+
+                report("threshold", {})
+                with timings.stage("threshold"):
+                    bw_image = to_thermal_ready(composed_image, threshold, binarize)
+                width, height = bw_image.width, bw_image.height
+                bw_slices = slice_image(bw_image, slice_height)
+            else:
+                # プレビュー不要なら、2値化してから1bit画像で回転・パディングする
+                report("threshold", {})
+                with timings.stage("composite"):
+                    composed_image = paste_layers(plan)
+                with timings.stage("threshold"):
+                    bw_image = self._orient_thermal(composed_image, rotate_mode, threshold, binarize)
+                width, height = bw_image.width, bw_image.height
+                bw_slices = slice_image(bw_image, slice_height)
+                if preview_path is not None:
+                    report("preview", {"path": str(preview_path)})
+                    preview_future = self._save_preview(
+                        bw_image, preview_path, preview_mode, preview_width, timings, preview_async
+                    )
 
-        if send_to_printer:
-            from phomemo_printer.ESCPOS_printer import Printer
+            if cache_key is not None and not streaming:
+                # ストリーミング時は全体のラスタを持たないため保存しない
+                self.render_cache.store(cache_key, PackedRaster.from_image(bw_image))
 
-            if not printer_address:
+        return PreparedJob(
+            output_cfg=output_cfg,
+            dry_run=bool(dry_run),
+            send_to_printer=bool(send_to_printer),
+            slices=bw_slices,
+            width=width,
+            height=height,
+            streaming=streaming,
+            color_mode=color_mode,
+            preview_path=preview_path,
+            preview_future=preview_future,
+            preview_image=preview_image,
+            cache_key=cache_key,
+            cache_hit=cached is not None,
+            cache_source=cache_source,
+            timings=timings,
+            report=report,
+            image=None if streaming else bw_image,
+        )
+
+    def deliver(
+        self,
+        job: PreparedJob,
+        printer_address: Optional[str] = None,
+        printer_channel: int = 1,
+        connection_pool: Optional[PrinterConnectionPool] = None,
+    ) -> LayoutJobResult:
+        """prepare_config で用意したジョブを送信し、結果をまとめる（run_config の後半）。"""
+        output_cfg = job.output_cfg
+        timings, report = job.timings, job.report
+        threshold = output_cfg.get("threshold", DEFAULT_THRESHOLD)
+        binarize = str(output_cfg.get("binarize", "threshold")).lower()
+        slice_height = output_cfg.get("slice_height", DEFAULT_SLICE_HEIGHT)
+        chunk_rows = output_cfg.get("chunk_rows", DEFAULT_CHUNK_ROWS)
+        write_buffer_size = int(output_cfg.get("write_buffer_size", DEFAULT_WRITE_BUFFER_SIZE))
+        write_interval = float(output_cfg.get("write_interval", 0.0))
+        # output.feed_blank_rows: true なら、白行が続く区間は GS v 0 ではなく ESC J の紙送りで送る（Bluetoothの送信量削減）。
+        # ESC J n の n が1ラスタ行ぶんの送りになるかは実機で確認できていないため、既定では使わない。
+        min_blank_rows = DEFAULT_MIN_BLANK_ROWS if output_cfg.get("feed_blank_rows", False) else 0
+        # 次のスライスの2値化・符号化を、今のスライスの書き込みと並行して何枚先まで進めるか
+        # （スキーマ検証を省いた呼び出しでも、キューの上限を超えて溜め込まないよう丸める）
+        prefetch_slices = min(int(output_cfg.get("prefetch_slices", DEFAULT_PREFETCH_SLICES)), MAX_PREFETCH_SLICES)
+        preview_mode = str(output_cfg.get("preview", "full")).lower()
+        preview_width = int(output_cfg.get("preview_width", DEFAULT_PREVIEW_WIDTH))
+
+        slice_heights: Optional[list[int]] = None
+        transmission: Optional[Dict] = None
+
+        target = resolve_printer_target(printer_address, printer_channel)
+
+        if job.send_to_printer:
+            if not target.address:
                 raise ValueError("send_to_printer=True の場合は printer_address が必要です。")
 
-            printer = Printer(printer_address, printer_channel)
-            try:
-                slice_heights = transmit(printer, bw_image, slice_height, chunk_rows)
-            finally:
-                printer.close()
+            report("transmit", {"slices_sent": 0})
+            connections = connection_pool or self.connections
+            with timings.stage("transmit"), connections.acquire(
+                target.address, target.channel
+            ) as printer:
+                writer = BufferedWriter(printer, write_buffer_size, write_interval)
+                sent_bytes = [0]
+
+                def on_slice(index: int, height: int) -> None:
+                    # スライスごとの送信バイト数（バッファ中の分も含む）
+                    timings.add_slice(index, height, writer.bytes_queued - sent_bytes[0])
+                    sent_bytes[0] = writer.bytes_queued
+                    report("transmit", {"slices_sent": index + 1, "slice_height": height})
+
+                slice_heights = transmit_slices(
+                    printer,
+                    job.slices,
+                    chunk_rows,
+                    writer=writer,
+                    on_slice=on_slice,
+                    min_blank_rows=min_blank_rows,
+                    prefetch=prefetch_slices,
+                )
+                transmission = writer.stats()
+        elif job.streaming:
+            for _ in job.slices:
+                pass
+
+        if job.streaming and job.preview_image is not None:
+            report("preview", {"path": str(job.preview_path)})
+            self._save_preview(job.preview_image, job.preview_path, preview_mode, preview_width, timings, False)
+        if job.preview_future is not None:
+            # 送信と並行してエンコードしたプレビューの完了を待つ（失敗していればここで例外になる）
+            job.preview_future.result()
 
         reason_not_printed: str | None = None
-        if not send_to_printer:
+        if not job.send_to_printer:
             # printed=false の典型原因を一言で返す（LLMが環境変数確認などを過剰に聞かないため）
-            if dry_run:
+            if job.dry_run:
                 reason_not_printed = "dry_run=true (preview only)"
             else:
                 reason_not_printed = "output.send_to_printer=false"
 
         return LayoutJobResult(
-            preview_path=preview_path,
-            printed=bool(send_to_printer),
+            preview_path=job.preview_path,
+            printed=job.send_to_printer,
             slice_heights=slice_heights,
             info={
                 "threshold": threshold,
+                "binarize": binarize,
                 "slice_height": slice_height,
                 "chunk_rows": chunk_rows,
-                "rotate": rotate_mode,
-                "width": bw_image.width,
-                "height": bw_image.height,
-                "dry_run": bool(dry_run),
-                "send_to_printer": bool(send_to_printer),
+                "rotate": str(output_cfg.get("rotate", "auto")).lower(),
+                "width": job.width,
+                "height": job.height,
+                "streaming": job.streaming,
+                # キャッシュヒット時は合成しないため None
+                "color_mode": job.color_mode,
+                "dry_run": job.dry_run,
+                "send_to_printer": job.send_to_printer,
                 "printer": {
                     # セキュリティ/ログ配慮でMACアドレス本体は返さない（存在有無と取得元のみ）
-                    "address_present": bool(printer_address),
-                    "address_source": printer_address_source,
-                    "channel": int(printer_channel),
-                    "channel_source": printer_channel_source,
+                    "address_present": bool(target.address),
+                    "address_source": target.address_source,
+                    "channel": target.channel,
+                    "channel_source": target.channel_source,
                 },
                 "reason_not_printed": reason_not_printed,
+                # 送信バイト数・書き込み回数・スループット（印刷しなかった場合は None）
+                "transmission": transmission,
+                # プロセス内キャッシュの累積ヒット/ミス
+                "cache": cache_stats(),
+                # 印刷用ラスタのキャッシュ: hit / source ("memory" | "disk")
+                "render_cache": {
+                    "enabled": job.cache_key is not None,
+                    "hit": job.cache_hit,
+                    "source": job.cache_source,
+                    **(self.render_cache.stats() if self.render_cache is not None else {}),
+                },
+                # 段階ごとの壁時計/CPU秒、レイヤーごとの描画内訳、スライスごとの送信バイト数
+                "timings": timings.to_dict(),
             },
         )
 
+    def run_batch(
+        self,
+        template: Dict,
+        rows: Iterable[Mapping[str, Any]],
+        base_dir: Optional[Path] = None,
+        printer_address: Optional[str] = None,
+        printer_channel: int = 1,
+        encoding: str = "utf-8",
+        dry_run: bool = False,
+        stop_on_error: bool = False,
+        prefetch: int = DEFAULT_PREFETCH_JOBS,
+    ) -> Iterator[Dict]:
+        """
+        テンプレートの {{field}} に各データ行を差し込み、1行ずつ実行して結果を返す。
+        - スキーマ検証はテンプレートに対して最初の1回だけ行う（差し込みは文字列の中だけなので型は変わらない）
+        - 差し込みの無い静的レイヤーは最初に1回だけ描画し、行ごとには可変レイヤーだけを描画する
+        - フォント・テキストレイアウトはプロセス内キャッシュで行をまたいで共有される
+        - プリンタ接続は行をまたいで保持し、バッチの終わりに閉じる
+        - prefetch>0 なら、送信中に別スレッドで prefetch 行先まで合成しておく（0 で逐次）
+        - output.path に {{field}} が無ければ、行番号を付けたパスに保存する（out.png → out_0.png, out_1.png, ...）
+        失敗した行は {"ok": false, "error": ...} として返し、stop_on_error なら打ち切る
+        （先読み済みの行はプレビューまで作られていることがある）。
+        """
+        self.validator.validate(template)
+        compiled = CompiledTemplate(template, encoding=encoding, workers=self.render_workers)
+        connections = self.connections
+        batch_pool: Optional[PrinterConnectionPool] = None
+        if connections.idle_timeout <= 0:
+            # 使用後すぐ閉じるプールでは行ごとに再接続になるため、バッチ中だけ接続を保持する
+            batch_pool = connections = PrinterConnectionPool(
+                idle_timeout=DEFAULT_IDLE_TIMEOUT, factory=self.connections.factory
+            )
+
+        # output.path に {{field}} が無いと全行が同じファイルに上書きされるため、行番号を付ける
+        output_path = template.get("output", {}).get("path")
+        number_paths = bool(output_path) and not template_fields(output_path)
+
+        def prepare_rows() -> Iterator[Tuple[int, Optional[PreparedJob], Optional[Exception]]]:
+            for index, row in enumerate(rows):
+                try:
+                    config = compiled.fill(row)
+                    if number_paths:
+                        path = Path(output_path)
+                        config["output"]["path"] = str(path.with_name(f"{path.stem}_{index}{path.suffix}"))
+                    job = self.prepare_config(
+                        config,
+                        base_dir=base_dir,
+                        encoding=encoding,
+                        dry_run=dry_run,
+                        validate=False,
+                        template=compiled,
+                    )
+                except Exception as exc:
+                    yield index, None, exc
+                    continue
+                yield index, job, None
+
+        try:
+            with closing(prefetch_items(prepare_rows(), prefetch, name="phomemo-batch")) as prepared:
+                for index, job, error in prepared:
+                    result: Optional[LayoutJobResult] = None
+                    if job is not None:
+                        try:
+                            result = self.deliver(job, printer_address, printer_channel, connections)
+                        except Exception as exc:
+                            error = exc
+                    if result is None:
+                        yield {"row": index, "ok": False, "error": str(error)}
+                        if stop_on_error:
+                            return
+                        continue
+                    yield {"row": index, "ok": True, **result.to_dict()}
+        finally:
+            if batch_pool is not None:
+                batch_pool.close_all()
+
+    def _save_preview(
+        self,
+        image: Image.Image,
+        path: Path,
+        mode: str,
+        width: int,
+        timings: JobTimings,
+        background: bool,
+    ) -> Optional[Future]:
+        """background=True ならワーカースレッドでエンコードし、Future を返す。"""
+
+        def save() -> None:
+            with timings.stage("preview"):
+                make_preview(image, mode, width).save(path, format="PNG")
+
+        if not background:
+            save()
+            return None
+        with self._preview_lock:
+            # 先読みのスレッドとジョブキューのワーカーから同時に呼ばれうる
+            if self._preview_executor is None:
+                self._preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phomemo-preview")
+            return self._preview_executor.submit(save)
+
+    @staticmethod
+    def _orientation_is_noop(plan: CanvasPlan, rotate_mode: str) -> bool:
+        """_apply_orientation が素通しになる（回転もパディングもリサイズも起きない）か。"""
+        if plan.width != CANVAS_WIDTH:
+            return False
+        if rotate_mode in ("none", "0", "false"):
+            return True
+        if rotate_mode in ("cw90", "ccw90"):
+            return False
+        return plan.width <= plan.height
+
+    @staticmethod
+    def _collect_preview(slices: Iterable[Image.Image], preview: Image.Image) -> Iterator[Image.Image]:
+        top = 0
+        for slice_img in slices:
+            preview.paste(slice_img, (0, top))
+            top += slice_img.height
+            yield slice_img
+
+    @staticmethod
+    def _rotation_op(image: Image.Image, rotate_mode: str) -> Optional[int]:
+        if rotate_mode == "cw90":
+            return Image.ROTATE_90
+        if rotate_mode == "ccw90":
+            return Image.ROTATE_270
+        # "auto" と未知の値は横長(width>height)のときだけ回転
+        return Image.ROTATE_90 if image.width > image.height else None
+
+    @staticmethod
+    def _fit_width(image: Image.Image) -> Image.Image:
+        # 幅576に合わせる: 576より狭ければパディング、広ければ縮小
+        if image.width < CANVAS_WIDTH:
+            mode = image.mode if image.mode in ("1", "L") else "RGBA"
+            bg = Image.new(mode, (CANVAS_WIDTH, image.height), _WHITE[mode])
+            x = (CANVAS_WIDTH - image.width) // 2
+            bg.paste(image, (x, 0), mask=image if image.mode == "RGBA" else None)
+            return bg
+        if image.width > CANVAS_WIDTH:
+            new_h = max(1, int(image.height * CANVAS_WIDTH / image.width))
+            return image.resize((CANVAS_WIDTH, new_h), resample=Image.LANCZOS)
+        return image
+
     def _apply_orientation(self, image: Image.Image, rotate_mode: str) -> Image.Image:
         """
         - rotate_mode:
@@ -144,45 +674,40 @@ class LayoutJobPipeline:
           - "auto": 横長(width>height)のとき90度回転（phomemo_printerのprint_image互換の感覚）
           - "cw90": 常に時計回り90度回転
           - "ccw90": 常に反時計回り90度回転
+        回転後（または回転なしでも）幅が576pxでなければパディング/縮小する。
         """
         if rotate_mode in ("none", "0", "false"):
             return image
+        rotate_op = self._rotation_op(image, rotate_mode)
+        if rotate_op is not None:
+            image = image.transpose(rotate_op)
+        return self._fit_width(image)
 
-        should_rotate = False
-        if rotate_mode == "auto":
-            should_rotate = image.width > image.height
-        elif rotate_mode == "cw90":
-            should_rotate = True
-            rotate_op = Image.ROTATE_90
-        elif rotate_mode == "ccw90":
-            should_rotate = True
-            rotate_op = Image.ROTATE_270
-        else:
-            # unknown => behave like auto
-            should_rotate = image.width > image.height
-            rotate_op = Image.ROTATE_90
-
-        if should_rotate:
-            rotate_op = rotate_op if "rotate_op" in locals() else Image.ROTATE_90
-            rotated = image.transpose(rotate_op)
-            # 幅576に合わせる: 576より狭ければパディング、広ければ縮小
-            if rotated.width < 576:
-                bg = Image.new("RGBA", (576, rotated.height), (255, 255, 255, 255))
-                x = (576 - rotated.width) // 2
-                bg.paste(rotated, (x, 0), mask=rotated if rotated.mode == "RGBA" else None)
-                return bg
-            if rotated.width > 576:
-                new_h = max(1, int(rotated.height * 576 / rotated.width))
-                return rotated.resize((576, new_h), resample=Image.LANCZOS)
-            return rotated
-
-        # 念のため幅がズレていたら縮小/拡張はせずパディング
-        if image.width < 576:
-            bg = Image.new("RGBA", (576, image.height), (255, 255, 255, 255))
-            x = (576 - image.width) // 2
-            bg.paste(image, (x, 0), mask=image if image.mode == "RGBA" else None)
-            return bg
-        if image.width > 576:
-            new_h = max(1, int(image.height * 576 / image.width))
-            return image.resize((576, new_h), resample=Image.LANCZOS)
-        return image
+    def _orient_thermal(
+        self,
+        image: Image.Image,
+        rotate_mode: str,
+        threshold: int,
+        binarize: str = "threshold",
+    ) -> Image.Image:
+        """
+        to_thermal_ready(_apply_orientation(image)) と同じ結果を、できるだけ2値化後の
+        1bit画像で回転・パディングして求める。縮小が必要な場合だけ従来どおり先に回転する。
+        ディザリングは画素の位置・走査方向に依存するため、常に回転後に行う。
+        """
+        if rotate_mode in ("none", "0", "false"):
+            return to_thermal_ready(image, threshold, binarize)
+        rotate_op = self._rotation_op(image, rotate_mode)
+        rotated_width = image.height if rotate_op is not None else image.width
+        if rotated_width > CANVAS_WIDTH or binarize != "threshold":
+            # LANCZOS縮小は階調に依存するため、2値化前に行う必要がある
+            return to_thermal_ready(self._apply_orientation(image, rotate_mode), threshold, binarize)
+        if rotated_width < CANVAS_WIDTH and image.mode == "RGBA":
+            # パディング時はアルファで白背景に合成される。同じ合成を回転前に済ませておく
+            flattened = Image.new("RGBA", image.size, _WHITE["RGBA"])
+            flattened.paste(image, (0, 0), mask=image)
+            image = flattened
+        bw_image = to_thermal_ready(image, threshold)
+        if rotate_op is not None:
+            bw_image = bw_image.transpose(rotate_op)
+        return self._fit_width(bw_image)
@@ -1,64 +1,213 @@
 from __future__ import annotations
 
-from typing import List
+import time
+from contextlib import closing
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 
 from PIL import Image
 
-from phomemo_printer.ESCPOS_constants import FOOTER, GSV0, HEADER, PRINT_FEED
+from phomemo_printer.ESCPOS_constants import FOOTER, HEADER, PRINT_FEED
 from phomemo_printer.ESCPOS_printer import Printer
 
 from .composer import slice_image
-from .constants import CANVAS_WIDTH
-
-
-def _send_slice(printer: Printer, image: Image.Image, chunk_rows: int) -> None:
-    if image.mode != "1":
-        image = image.convert("1")
-    if image.width != CANVAS_WIDTH:
-        raise ValueError(f"画像幅は{CANVAS_WIDTH}pxである必要があります。")
-    if chunk_rows <= 0 or chunk_rows > 256:
-        raise ValueError("chunk_rowsは1-256で指定してください。")
-
-    width_bytes = image.width // 8
-    pixels = image.load()
-    height = image.height
-
-    for start_row in range(0, height, chunk_rows):
-        block_height = min(chunk_rows, height - start_row)
-        block_marker = (
-            GSV0
-            + bytes([width_bytes])
-            + b"\x00"
-            + bytes([block_height - 1])
-            + b"\x00"
-        )
-        printer._print_bytes(block_marker)
-
-        for row_offset in range(block_height):
-            y = start_row + row_offset
-            line = bytearray()
-            for byte_start in range(width_bytes):
-                byte = 0
-                for bit in range(8):
-                    x = byte_start * 8 + bit
-                    if pixels[x, y] == 0:
-                        byte |= 1 << (7 - bit)
-                if byte == 0x0A:
-                    byte = 0x14
-                line.append(byte)
-            printer._print_bytes(bytes(line))
-
-
-def transmit(printer: Printer, image: Image.Image, slice_height: int, chunk_rows: int) -> List[int]:
+from .connection import PrinterIOError
+from .constants import DEFAULT_WRITE_BUFFER_SIZE
+from .prefetch import prefetch as prefetch_items
+from .raster import PackedRaster, iter_packed_commands, iter_slice_commands, raster_size
+
+T = TypeVar("T")
+
+
+class BufferedWriter:
+    """
+    プリンタへの細かい書き込みをまとめ、buffer_size バイト単位で送る（ソケットには送り切るまで書き込む）。
+    flush_interval(秒) を指定すると、書き込みの間に待ちを入れてプリンタの受信バッファに合わせる。
+    """
+
+    def __init__(
+        self,
+        printer: Printer,
+        buffer_size: int = DEFAULT_WRITE_BUFFER_SIZE,
+        flush_interval: float = 0.0,
+    ) -> None:
+        if buffer_size <= 0:
+            raise ValueError("buffer_sizeは1以上で指定してください。")
+        if flush_interval < 0:
+            raise ValueError("flush_intervalは0以上で指定してください。")
+        self.printer = printer
+        self.buffer_size = int(buffer_size)
+        self.flush_interval = float(flush_interval)
+        self._buffer = bytearray()
+        self.bytes_written = 0
+        self.writes = 0
+        # 白行を紙送りコマンドに置き換えたことで送らずに済んだバイト数
+        self.bytes_saved = 0
+        # プリンタへの書き込みで過ごした時間（Bluetooth書き込み待ち）
+        self.write_sec = 0.0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self.buffer_size:
+            chunk = bytes(self._buffer[: self.buffer_size])
+            del self._buffer[: self.buffer_size]
+            self._send(chunk)
+
+    def flush(self) -> None:
+        if self._buffer:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            self._send(chunk)
+
+    def _send(self, chunk: bytes) -> None:
+        now = time.perf_counter()
+        if self._started is None:
+            self._started = now
+        elif self.flush_interval > 0:
+            time.sleep(self.flush_interval)
+        started = time.perf_counter()
+        try:
+            sock = getattr(self.printer, "s", None)
+            if sock is None:
+                # ループバックなど、_print_bytes が全体を書き込むプリンタ
+                self.printer._print_bytes(chunk)
+                self.bytes_written += len(chunk)
+            else:
+                # Printer._print_bytes は socket.send の戻り値を見ず、一部しか送れなかった残りを捨てるため、
+                # ソケットへ直接、全体を送り切るまで書き込む（実際に送れた分だけ数える）
+                view = memoryview(chunk)
+                while view:
+                    sent = sock.send(view)
+                    self.bytes_written += sent
+                    view = view[sent:]
+        except PrinterIOError:
+            raise
+        except OSError as exc:
+            raise PrinterIOError(*exc.args) from exc
+        finally:
+            self.write_sec += time.perf_counter() - started
+        self.writes += 1
+        self._finished = time.perf_counter()
+
+    @property
+    def bytes_queued(self) -> int:
+        """送信済み + バッファ中のバイト数。"""
+        return self.bytes_written + len(self._buffer)
+
+    def stats(self) -> Dict:
+        elapsed = 0.0
+        if self._started is not None and self._finished is not None:
+            elapsed = self._finished - self._started
+        return {
+            "bytes": self.bytes_written,
+            "bytes_saved": self.bytes_saved,
+            "writes": self.writes,
+            "buffer_size": self.buffer_size,
+            "flush_interval": self.flush_interval,
+            "elapsed_sec": round(elapsed, 6),
+            "write_sec": round(self.write_sec, 6),
+            "bytes_per_sec": round(self.bytes_written / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+def _encode_slice(
+    image: Union[Image.Image, PackedRaster],
+    chunk_rows: int,
+    min_blank_rows: int = 0,
+) -> Tuple[int, bytes, int]:
+    """スライスを送信用のバイト列にする。(行数, バイト列, 紙送り置換で省いたバイト数) を返す。"""
+    if isinstance(image, PackedRaster):
+        commands = iter_packed_commands(image, chunk_rows, min_blank_rows)
+    else:
+        if image.mode != "1":
+            image = image.convert("1")
+        commands = iter_slice_commands(image, chunk_rows, min_blank_rows)
+
+    data = b"".join(commands)
+    saved = raster_size(image.height, chunk_rows, image.width // 8) - len(data)
+    return image.height, data, saved
+
+
+def transmit(
+    printer: Printer,
+    image: Image.Image,
+    slice_height: int,
+    chunk_rows: int,
+    writer: Optional[BufferedWriter] = None,
+    on_slice: Optional[Callable[[int, int], None]] = None,
+    min_blank_rows: int = 0,
+    prefetch: int = 0,
+) -> List[int]:
+    """
+    画像をスライスして送信する。writer を渡すと、その設定でまとめ書きし送信統計を残す。
+    on_slice にはスライス送信ごとに (index, height) が渡される。
+    min_blank_rows>0 なら、その行数以上続く白行をラスタではなく紙送りコマンドで送る。
+    prefetch>0 なら、書き込みと並行して prefetch スライス先まで符号化しておく。
+    """
     slices = slice_image(image, slice_height)
-    printer._print_bytes(HEADER)
+    return transmit_slices(
+        printer,
+        slices,
+        chunk_rows,
+        writer=writer,
+        on_slice=on_slice,
+        min_blank_rows=min_blank_rows,
+        prefetch=prefetch,
+    )
+
+
+def transmit_slices(
+    printer: Printer,
+    slices: Iterable[Union[Image.Image, PackedRaster]],
+    chunk_rows: int,
+    writer: Optional[BufferedWriter] = None,
+    on_slice: Optional[Callable[[int, int], None]] = None,
+    min_blank_rows: int = 0,
+    prefetch: int = 0,
+) -> List[int]:
+    """
+    スライス済み画像（または PackedRaster）を順に送信する。slices はジェネレータでもよく、
+    生成されたそばから送るため、全体の画像を保持しなくても印刷できる。
+    prefetch>0 なら、スライスの生成（ストリーミング時は合成・2値化も）と符号化を別スレッドで
+    prefetch 枚先まで進め、Bluetoothへの書き込みと重ねる。先読みは高々 prefetch 枚なのでメモリは増えない。
+    on_slice やスライスの生成が例外を投げたら、送り終えたブロックの後に紙送りと終端を送ってから例外を投げ直す
+    （プリンタがラスタの続きを待ったまま次のジョブを受け取らないように）。
+    """
+    writer = writer or BufferedWriter(printer)
+    writer.write(HEADER)
     heights: List[int] = []
-    for index, slice_img in enumerate(slices):
-        _send_slice(printer, slice_img, chunk_rows)
-        heights.append(slice_img.height)
-        printer._print_bytes(PRINT_FEED)
-        if index != len(slices) - 1:
-            printer._print_bytes(PRINT_FEED)
-    printer._print_bytes(PRINT_FEED)
-    printer._print_bytes(FOOTER)
+    stopped: List[Exception] = []
+    encoded = (_encode_slice(slice_img, chunk_rows, min_blank_rows) for slice_img in slices)
+    # 途中で例外になっても、先読みスレッドをその場で止める
+    with closing(prefetch_items(encoded, prefetch, name="phomemo-encode")) as encoded_slices:
+        for index, (height, data, saved) in enumerate(_until_error(encoded_slices, stopped)):
+            if index > 0:
+                # スライス間の追加フィード（最後のスライスの後には送らない）
+                writer.write(PRINT_FEED)
+            writer.write(data)
+            writer.bytes_saved += saved
+            heights.append(height)
+            writer.write(PRINT_FEED)
+            if on_slice is not None:
+                try:
+                    on_slice(index, height)
+                except Exception as exc:
+                    # 取り消しなどでコールバックが中断を求めたら、送り終えたブロックの後で止める
+                    stopped.append(exc)
+                    break
+    # 中断した場合も、書きかけのブロックを残さないよう紙送りと終端まで送ってから例外を投げ直す
+    writer.write(PRINT_FEED)
+    writer.write(FOOTER)
+    writer.flush()
+    if stopped:
+        raise stopped[0]
     return heights
+
+
+def _until_error(items: Iterable[T], errors: List[Exception]) -> Iterator[T]:
+    """items を順に返し、途中で例外になったら errors に入れてそこで打ち切る（スライスの合成失敗など）。"""
+    try:
+        yield from items
+    except Exception as exc:
+        errors.append(exc)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import csv
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, Mapping, Optional, TextIO
+
+PLACEHOLDER = re.compile(r"\{\{\s*([^{}\s]+)\s*\}\}")
+
+BATCH_FORMATS = ("csv", "ndjson")
+
+
+def fill_template(template: Any, row: Mapping[str, Any]) -> Any:
+    """
+    テンプレート中の文字列にある {{field}} を row の値で置き換えたコピーを返す（キーは置き換えない）。
+    値が None のフィールドは空文字になる。row に無いフィールドは ValueError。
+    """
+    if isinstance(template, str):
+        return PLACEHOLDER.sub(lambda match: _field_value(row, match.group(1)), template)
+    if isinstance(template, dict):
+        return {key: fill_template(value, row) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill_template(value, row) for value in template]
+    return template
+
+
+def _field_value(row: Mapping[str, Any], name: str) -> str:
+    if name not in row:
+        raise ValueError(f"データ行にフィールドがありません: {name}")
+    value = row[name]
+    return "" if value is None else str(value)
+
+
+def template_fields(template: Any) -> set[str]:
+    """テンプレートが参照するフィールド名の集合。"""
+    if isinstance(template, str):
+        return set(PLACEHOLDER.findall(template))
+    if isinstance(template, dict):
+        return set().union(*(template_fields(value) for value in template.values()))
+    if isinstance(template, list):
+        return set().union(*(template_fields(value) for value in template))
+    return set()
+
+
+def iter_csv_rows(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """1行目をヘッダとして、各行を {列名: 値} で返す。"""
+    yield from csv.DictReader(stream)
+
+
+def iter_ndjson_rows(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"NDJSONの{line_no}行目を解析できません: {exc}") from None
+        if not isinstance(row, dict):
+            raise ValueError(f"NDJSONの{line_no}行目がオブジェクトではありません。")
+        yield row
+
+
+def detect_format(path: Optional[Path]) -> str:
+    """拡張子から形式を推定する（.csv → csv、それ以外 → ndjson）。"""
+    if path is not None and path.suffix.lower() == ".csv":
+        return "csv"
+    return "ndjson"
+
+
+def iter_rows(stream: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt not in BATCH_FORMATS:
+        raise ValueError(f"未知のデータ形式です: {fmt} ({' / '.join(BATCH_FORMATS)})")
+    return iter_csv_rows(stream) if fmt == "csv" else iter_ndjson_rows(stream)
@@ -0,0 +1,3 @@
+"""
+レンダリング/印刷パイプラインのベンチマーク（オフラインで実行できる）。
+"""
@@ -0,0 +1,79 @@
+"""
+python -m phomemo_agent.benchmarks: コーパスを生成して段階ごとに計測し、JSONで出力する。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, Optional
+
+from .corpus import CORPUS, build_corpus
+from .pipeline import bench_job, compare
+
+
+def _version(package: str) -> Optional[str]:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def environment() -> Dict:
+    # Pillow / imagetext の更新で遅くなったかを追えるよう、バージョンを結果に残す
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": {
+            name: _version(name) for name in ("Pillow", "numpy", "imagetext-py", "jsonschema")
+        },
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="レンダリング/印刷パイプラインを段階ごとに計測")
+    parser.add_argument(
+        "--font",
+        default=os.getenv("PHOMEMO_BENCH_FONT"),
+        help="本文フォント (default: 環境変数 PHOMEMO_BENCH_FONT)",
+    )
+    parser.add_argument("--fallback-font", action="append", default=[], help="フォールバックフォント（複数可）")
+    parser.add_argument("--corpus-dir", type=Path, help="コーパスの出力先（省略時は一時ディレクトリ）")
+    parser.add_argument("--job", action="append", choices=list(CORPUS), help="計測するジョブ（省略時は全部）")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最良値を採用）")
+    parser.add_argument("--output", type=Path, help="結果JSONの保存先（省略時は標準出力）")
+    parser.add_argument("--baseline", type=Path, help="比較対象の過去の結果JSON")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.font:
+        print("error: --font か PHOMEMO_BENCH_FONT でフォントを指定してください", file=sys.stderr)
+        return 2
+
+    with tempfile.TemporaryDirectory(prefix="phomemo_bench_") as tmp:
+        corpus_dir = args.corpus_dir or Path(tmp)
+        job_paths = build_corpus(corpus_dir, args.font, args.fallback_font, args.job)
+        jobs = [bench_job(path, repeat=args.repeat) for path in job_paths]
+
+    result: Dict = {"environment": environment(), "repeat": args.repeat, "jobs": jobs}
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        result["comparison"] = compare(jobs, baseline.get("jobs", []))
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
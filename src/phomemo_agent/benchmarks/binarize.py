@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+from ..binarize import BINARIZE_METHODS, Binarizer
+from ..constants import CANVAS_WIDTH, DEFAULT_THRESHOLD
+
+
+def synthetic_photo(width: int, height: int, seed: int = 0) -> Image.Image:
+    """写真レイヤー相当の階調画像（グラデーション + 模様 + ノイズ）を作る。"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    values = (
+        128
+        + 90 * np.sin(x / 37.0) * np.cos(y / 53.0)
+        + 40 * (x / width - 0.5)
+        + rng.normal(0, 12, size=(height, width))
+    )
+    return Image.fromarray(np.clip(values, 0, 255).astype(np.uint8), mode="L")
+
+
+def bench_binarize(height: int, repeat: int, threshold: int) -> List[Dict]:
+    image = synthetic_photo(CANVAS_WIDTH, height)
+    megapixels = image.width * image.height / 1_000_000
+    results: List[Dict] = []
+    for method in BINARIZE_METHODS:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            Binarizer(threshold, method)(image)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results.append(
+            {
+                "method": method,
+                "width": image.width,
+                "height": image.height,
+                "best_sec": round(best, 4),
+                "sec_per_megapixel": round(best / megapixels, 4),
+            }
+        )
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="2値化方式ごとの処理時間を計測")
+    parser.add_argument("--height", type=int, default=10000, help="画像の高さ (default: 10000)")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最良値を採用）")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    results = bench_binarize(args.height, args.repeat, args.threshold)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+ベンチマーク用の代表的なレイアウトジョブを生成する。
+画像やテキストファイルも合わせて書き出すため、ネットワークや実機なしで再現できる。
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ..constants import CANVAS_WIDTH
+from .binarize import synthetic_photo
+
+CorpusBuilder = Callable[[Path, Dict], Dict]
+
+_RECEIPT_ITEMS = [
+    ("おにぎり（鮭）", 160),
+    ("緑茶 500ml", 140),
+    ("唐揚げ弁当", 598),
+    ("サラダチキン", 258),
+    ("消費税（8%）", 92),
+]
+_EMOJI_LINES = [
+    "☀️ 今日の予定 📅",
+    "✅ 牛乳を買う 🥛",
+    "🚀 デプロイ 15:00 🎉",
+    "🐈 猫のごはん 🍣🍙",
+    "⚠️ 傘を忘れずに ☔",
+]
+
+
+def _canvas(defaults: Dict, **overrides) -> Dict:
+    canvas = {
+        "font_path": defaults["font_path"],
+        "fallback_fonts": list(defaults.get("fallback_fonts", [])),
+        "background_color": "#FFFFFF",
+        "margin": 20,
+        "line_spacing": 1.2,
+        "wrap_style": "character",
+    }
+    canvas.update(overrides)
+    return canvas
+
+
+def _output(**overrides) -> Dict:
+    output = {"send_to_printer": False}
+    output.update(overrides)
+    return output
+
+
+def cjk_receipt(directory: Path, defaults: Dict) -> Dict:
+    lines = ["ご来店ありがとうございます", "2024/05/01 12:34  レジ#02", "-" * 24]
+    lines += [f"{name}  ¥{price:,}" for name, price in _RECEIPT_ITEMS]
+    lines += ["-" * 24, f"合計  ¥{sum(price for _, price in _RECEIPT_ITEMS):,}"]
+    return {
+        "canvas": _canvas(defaults),
+        "layers": [
+            {"type": "text", "text": "ファミリーストア 駅前店", "font_size": 40, "position": {"x": 20, "y": 20}},
+            {
+                "type": "text",
+                "text": "\n".join(lines),
+                "font_size": 28,
+                "position": {"x": 20, "y": 90},
+                "width": CANVAS_WIDTH - 40,
+            },
+        ],
+        "output": _output(rotate="none"),
+    }
+
+
+def emoji_note(directory: Path, defaults: Dict) -> Dict:
+    return {
+        "canvas": _canvas(defaults),
+        "layers": [
+            {
+                "type": "text",
+                "text": "\n".join(_EMOJI_LINES * 4),
+                "font_size": 36,
+                "position": {"x": 20, "y": 20},
+                "width": CANVAS_WIDTH - 40,
+                "stroke": {"width": 1, "color": "#FFFFFF"},
+            }
+        ],
+        "output": _output(),
+    }
+
+
+def long_log(directory: Path, defaults: Dict, lines: int = 600) -> Dict:
+    log_path = directory / "long_log.txt"
+    log_path.write_text(
+        "\n".join(
+            f"2024-05-01T12:{index // 60 % 60:02d}:{index % 60:02d} INFO worker-{index % 8} "
+            f"ジョブ {index} を処理しました (elapsed={index * 7 % 997}ms)"
+            for index in range(lines)
+        ),
+        encoding="utf-8",
+    )
+    return {
+        "canvas": _canvas(defaults, margin=10),
+        "layers": [
+            {
+                "type": "text",
+                "text_file": str(log_path),
+                "font_size": 20,
+                "position": {"x": 10, "y": 10},
+                "width": CANVAS_WIDTH - 20,
+            }
+        ],
+        "output": _output(),
+    }
+
+
+def photo(directory: Path, defaults: Dict) -> Dict:
+    photo_path = directory / "photo.png"
+    synthetic_photo(960, 720, seed=1).convert("RGB").save(photo_path)
+    return {
+        "canvas": _canvas(defaults),
+        "layers": [
+            {"type": "image", "path": str(photo_path), "max_width": CANVAS_WIDTH, "position": {"x": 0, "y": 0}},
+            {"type": "text", "text": "写真キャプション", "font_size": 28, "position": {"x": 20, "y": 450}},
+        ],
+        "output": _output(binarize="floyd_steinberg"),
+    }
+
+
+def ruler(directory: Path, defaults: Dict, height: int = 6000) -> Dict:
+    ruler_path = directory / "ruler.png"
+    image = Image.new("L", (CANVAS_WIDTH, height), 255)
+    draw = ImageDraw.Draw(image)
+    # 8px = 1mm（203dpi相当）の目盛り。1cmごとに長い線
+    for y in np.arange(0, height, 8):
+        length = 120 if y % 80 == 0 else (60 if y % 40 == 0 else 24)
+        draw.line([(0, int(y)), (length, int(y))], fill=0, width=2)
+    ruler_path.parent.mkdir(parents=True, exist_ok=True)
+    image.save(ruler_path)
+    return {
+        "canvas": _canvas(defaults, margin=0),
+        "layers": [
+            {"type": "image", "path": str(ruler_path), "position": {"x": 0, "y": 0}},
+            {"type": "text", "text": "0 cm", "font_size": 24, "position": {"x": 140, "y": 4}},
+        ],
+        "output": _output(rotate="none"),
+    }
+
+
+CORPUS: Dict[str, CorpusBuilder] = {
+    "cjk_receipt": cjk_receipt,
+    "emoji_note": emoji_note,
+    "long_log": long_log,
+    "photo": photo,
+    "ruler": ruler,
+}
+
+
+def build_corpus(
+    directory: Path,
+    font_path: str,
+    fallback_fonts: Sequence[str] = (),
+    names: Optional[Sequence[str]] = None,
+) -> List[Path]:
+    """
+    directory にジョブJSON（と参照する画像・テキスト）を書き出し、JSONのパスを返す。
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    defaults = {"font_path": font_path, "fallback_fonts": list(fallback_fonts)}
+    paths: List[Path] = []
+    for name in names or CORPUS:
+        if name not in CORPUS:
+            raise ValueError(f"未知のコーパス名です: {name} ({' / '.join(CORPUS)})")
+        job = CORPUS[name](directory, defaults)
+        job_path = directory / f"{name}.json"
+        job_path.write_text(json.dumps(job, ensure_ascii=False, indent=2), encoding="utf-8")
+        paths.append(job_path)
+    return paths
@@ -0,0 +1,154 @@
+"""
+レイアウトジョブを段階ごと（validate / compose / orientation / threshold / pack / transmit）に計測する。
+transmit は何も送らないプリンタ（NullPrinter）に対して行う。
+"""
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+from PIL import Image
+
+from ..composer import image_nbytes, paste_layers, prepare_canvas, slice_image, to_thermal_ready
+from ..constants import (
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_MIN_BLANK_ROWS,
+    DEFAULT_SLICE_HEIGHT,
+    DEFAULT_THRESHOLD,
+    DEFAULT_WRITE_BUFFER_SIZE,
+)
+from ..pipeline import LayoutJobPipeline
+from ..printer import BufferedWriter, transmit_slices
+from ..raster import iter_slice_commands
+from ..validators import LayoutJobValidator
+
+T = TypeVar("T")
+
+STAGES = ("validate", "compose", "orientation", "threshold", "pack", "transmit")
+
+
+class NullPrinter:
+    """受け取ったバイト数だけ数えて捨てる Printer の代用品。"""
+
+    def __init__(self) -> None:
+        self.bytes_received = 0
+
+    def _print_bytes(self, data: bytes) -> None:
+        self.bytes_received += len(data)
+
+    def close(self) -> None:
+        pass
+
+
+def _best(func: Callable[[], T], repeat: int) -> Tuple[float, T]:
+    best = float("inf")
+    result = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _stage(sec: float, rows: int, nbytes: int) -> Dict:
+    """rows/sec は処理した行数、MB/sec はその段階が出力したバイト数で計算する。"""
+    return {
+        "sec": round(sec, 6),
+        "rows": rows,
+        "bytes": nbytes,
+        "rows_per_sec": round(rows / sec, 1) if sec > 0 else None,
+        "mb_per_sec": round(nbytes / sec / 1_000_000, 3) if sec > 0 else None,
+    }
+
+
+def bench_job(job_path: Path, repeat: int = 3, encoding: str = "utf-8") -> Dict:
+    """
+    各段階を repeat 回実行し最良値を採る。キャッシュが効いた状態（常駐プロセス相当）の値になる。
+    """
+    config = json.loads(job_path.read_text(encoding="utf-8"))
+    validator = LayoutJobValidator()
+    output_cfg = config.get("output", {})
+    rotate_mode = str(output_cfg.get("rotate", "auto")).lower()
+    threshold = output_cfg.get("threshold", DEFAULT_THRESHOLD)
+    binarize = str(output_cfg.get("binarize", "threshold")).lower()
+    slice_height = output_cfg.get("slice_height", DEFAULT_SLICE_HEIGHT)
+    chunk_rows = output_cfg.get("chunk_rows", DEFAULT_CHUNK_ROWS)
+    min_blank_rows = DEFAULT_MIN_BLANK_ROWS if output_cfg.get("feed_blank_rows", False) else 0
+    orient = LayoutJobPipeline(validator=validator)._apply_orientation
+
+    stages: Dict[str, Dict] = {}
+
+    sec, _ = _best(lambda: validator.validate(config), repeat)
+    stages["validate"] = _stage(sec, 0, 0)
+
+    def compose() -> Image.Image:
+        return paste_layers(prepare_canvas(config, encoding=encoding))
+
+    sec, composed = _best(compose, repeat)
+    stages["compose"] = _stage(sec, composed.height, image_nbytes(composed))
+
+    sec, oriented = _best(lambda: orient(composed, rotate_mode), repeat)
+    stages["orientation"] = _stage(sec, oriented.height, image_nbytes(oriented))
+
+    sec, bw_image = _best(lambda: to_thermal_ready(oriented, threshold, binarize), repeat)
+    stages["threshold"] = _stage(sec, bw_image.height, image_nbytes(bw_image))
+
+    slices = slice_image(bw_image, slice_height)
+
+    def pack() -> int:
+        return sum(
+            len(command)
+            for slice_img in slices
+            for command in iter_slice_commands(slice_img, chunk_rows, min_blank_rows)
+        )
+
+    sec, packed_bytes = _best(pack, repeat)
+    stages["pack"] = _stage(sec, bw_image.height, packed_bytes)
+
+    def transmit() -> int:
+        printer = NullPrinter()
+        writer = BufferedWriter(printer, DEFAULT_WRITE_BUFFER_SIZE)
+        transmit_slices(printer, slices, chunk_rows, writer=writer, min_blank_rows=min_blank_rows)
+        return printer.bytes_received
+
+    # transmit は pack（コマンド生成）を含む送信経路全体の時間
+    sec, sent_bytes = _best(transmit, repeat)
+    stages["transmit"] = _stage(sec, bw_image.height, sent_bytes)
+
+    return {
+        "job": job_path.stem,
+        "width": bw_image.width,
+        "height": bw_image.height,
+        "slices": len(slices),
+        "total_sec": round(sum(stage["sec"] for stage in stages.values()), 6),
+        "stages": stages,
+    }
+
+
+def compare(current: List[Dict], baseline: List[Dict]) -> List[Dict]:
+    """
+    前回の結果と段階ごとの所要時間を比べる。ratio>1 は今回の方が遅い。
+    """
+    previous = {job["job"]: job for job in baseline}
+    rows: List[Dict] = []
+    for job in current:
+        before = previous.get(job["job"])
+        if before is None:
+            continue
+        for stage in STAGES:
+            now_sec = job["stages"][stage]["sec"]
+            before_sec = before.get("stages", {}).get(stage, {}).get("sec")
+            if not before_sec:
+                continue
+            rows.append(
+                {
+                    "job": job["job"],
+                    "stage": stage,
+                    "baseline_sec": before_sec,
+                    "sec": now_sec,
+                    "ratio": round(now_sec / before_sec, 3),
+                }
+            )
+    return rows
@@ -0,0 +1,114 @@
+"""
+python -m phomemo_agent.benchmarks.streaming_memory: output.streaming のジョブで、出力が長くなっても
+ピークメモリ（最大RSS）がほぼ変わらないことを確かめる。ジョブごとに新しいプロセスで実行して比べ、
+最短と最長のジョブの差が許容量を超えたら終了コード1を返す。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from ..constants import CANVAS_WIDTH
+from .binarize import synthetic_photo
+from .corpus import long_log
+
+PHOTO_HEIGHT = 400
+
+
+def build_job(directory: Path, font_path: str, lines: int, streaming: bool) -> Path:
+    """写真レイヤー + lines 行のログ（テキストレイヤー）のジョブを書き出す。"""
+    job = long_log(directory, {"font_path": font_path}, lines=lines)
+    photo_path = directory / "photo.png"
+    synthetic_photo(CANVAS_WIDTH, PHOTO_HEIGHT, seed=1).convert("RGB").save(photo_path)
+    job["layers"][0]["position"]["y"] = PHOTO_HEIGHT + 10
+    job["layers"].insert(0, {"type": "image", "path": str(photo_path), "position": {"x": 0, "y": 0}})
+    job["output"] = {"send_to_printer": True, "rotate": "none", "streaming": streaming, "cache": False}
+    job_path = directory / f"memory_{lines}_{'stream' if streaming else 'full'}.json"
+    job_path.write_text(json.dumps(job, ensure_ascii=False), encoding="utf-8")
+    return job_path
+
+
+def _peak_rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS は bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_job(job_path: str, results: "multiprocessing.Queue") -> None:
+    from ..pipeline import LayoutJobPipeline
+
+    pipeline = LayoutJobPipeline(render_cache=None)
+    try:
+        # 送信先はループバック（記録するのは1bitのラスタだけ）
+        result = pipeline.run(Path(job_path), printer_address="loopback://streaming-memory")
+    finally:
+        pipeline.close()
+    results.put({"height": sum(result.slice_heights or []), "peak_rss_mb": round(_peak_rss_mb(), 1)})
+
+
+def measure_job(job_path: Path) -> Dict:
+    """新しいプロセスでジョブを実行し、出力の高さと最大RSSを返す。"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_job, args=(str(job_path), results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"ジョブの実行に失敗しました: {job_path.name} (exit {process.exitcode})")
+    return results.get()
+
+
+def check_streaming_memory(
+    font_path: str, lines: List[int], tolerance_mb: float, compare_full: bool = False
+) -> Dict:
+    runs: List[Dict] = []
+    with tempfile.TemporaryDirectory(prefix="phomemo_memory_") as tmp:
+        for count in sorted(lines):
+            for streaming in (True, False) if compare_full else (True,):
+                job_path = build_job(Path(tmp), font_path, count, streaming)
+                runs.append({"lines": count, "streaming": streaming, **measure_job(job_path)})
+    streamed = [run for run in runs if run["streaming"]]
+    growth = streamed[-1]["peak_rss_mb"] - streamed[0]["peak_rss_mb"]
+    return {
+        "runs": runs,
+        "growth_mb": round(growth, 1),
+        "tolerance_mb": tolerance_mb,
+        "flat": growth <= tolerance_mb,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ストリーミング印刷のピークメモリが出力の長さによらないかを確かめる")
+    parser.add_argument(
+        "--font",
+        default=os.getenv("PHOMEMO_BENCH_FONT"),
+        help="本文フォント (default: 環境変数 PHOMEMO_BENCH_FONT)",
+    )
+    parser.add_argument(
+        "--lines", type=int, action="append", help="ログの行数（複数可。default: 400 と 2000）"
+    )
+    parser.add_argument("--tolerance-mb", type=float, default=24.0, help="最短と最長のジョブで許すRSSの差 (MB)")
+    parser.add_argument("--compare-full", action="store_true", help="ストリーミングなしの場合も計測する")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.font:
+        print("error: --font か PHOMEMO_BENCH_FONT でフォントを指定してください", file=sys.stderr)
+        return 2
+    result = check_streaming_memory(args.font, args.lines or [400, 2000], args.tolerance_mb, args.compare_full)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result["flat"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+"""
+python -m phomemo_agent.benchmarks.validation: レイアウトJSONの検証を、コンパイルした高速チェック（compiled）と
+jsonschema による全エラー収集（full）で比べる。ベンチマーク用のジョブに加え、長いテキストを直接含むジョブと
+不正なジョブも計測する。1回あたりの時間（マイクロ秒）をJSONで出力する。
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+from ..validators import LayoutJobValidator
+from .corpus import CORPUS, long_log
+
+INLINE_TEXT_LINES = 2000
+
+
+def build_jobs(directory: Path, font_path: str) -> Dict[str, Dict]:
+    defaults = {"font_path": font_path}
+    jobs = {name: builder(directory, defaults) for name, builder in CORPUS.items()}
+    inline = long_log(directory, defaults, lines=INLINE_TEXT_LINES)
+    layer = inline["layers"][0]
+    layer.pop("text_file", None)
+    layer["text"] = "\n".join(f"{index:05d} INFO 処理が完了しました" for index in range(INLINE_TEXT_LINES))
+    jobs["inline_text"] = inline
+    invalid = copy.deepcopy(jobs["cjk_receipt"])
+    invalid["output"]["slice_height"] = -1
+    jobs["invalid"] = invalid
+    return jobs
+
+
+def _time_us(func: Callable[[], object], repeat: int) -> float:
+    """repeat 回の実行を5セット計り、最速のセットの1回あたりの時間を返す。"""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return round(best / repeat * 1e6, 1)
+
+
+def _validate(validator: LayoutJobValidator, job: Dict) -> Callable[[], bool]:
+    def run() -> bool:
+        try:
+            validator.validate(job)
+        except ValueError:
+            return False
+        return True
+
+    return run
+
+
+def run_validation_benchmark(font_path: str, repeat: int) -> Dict:
+    compiled = LayoutJobValidator(mode="compiled")
+    full = LayoutJobValidator(mode="full")
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory(prefix="phomemo_validation_") as tmp:
+        for name, job in build_jobs(Path(tmp), font_path).items():
+            compiled_us = _time_us(_validate(compiled, job), repeat)
+            full_us = _time_us(_validate(full, job), repeat)
+            results[name] = {
+                "valid": _validate(compiled, job)(),
+                "json_bytes": len(json.dumps(job, ensure_ascii=False).encode("utf-8")),
+                "compiled_us": compiled_us,
+                "full_us": full_us,
+                "speedup": round(full_us / compiled_us, 2) if compiled_us else None,
+            }
+    return {"repeat": repeat, "jobs": results}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="レイアウトJSONの検証時間を compiled と full で比べる")
+    parser.add_argument(
+        "--font",
+        default=os.getenv("PHOMEMO_BENCH_FONT"),
+        help="ジョブに書くフォントのパス (default: 環境変数 PHOMEMO_BENCH_FONT)",
+    )
+    parser.add_argument("--repeat", type=int, default=200, help="1セットあたりの検証回数")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.font:
+        print("error: --font か PHOMEMO_BENCH_FONT でフォントを指定してください", file=sys.stderr)
+        return 2
+    print(json.dumps(run_validation_benchmark(args.font, args.repeat), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+# (dy, dx, weight): 処理中の画素から見た誤差の配分先
+FLOYD_STEINBERG_KERNEL: Sequence[Tuple[int, int, float]] = (
+    (0, 1, 7 / 16),
+    (1, -1, 3 / 16),
+    (1, 0, 5 / 16),
+    (1, 1, 1 / 16),
+)
+# Atkinson は誤差の 6/8 だけを配分する（白飛び・黒潰れしにくい）
+ATKINSON_KERNEL: Sequence[Tuple[int, int, float]] = (
+    (0, 1, 1 / 8),
+    (0, 2, 1 / 8),
+    (1, -1, 1 / 8),
+    (1, 0, 1 / 8),
+    (1, 1, 1 / 8),
+    (2, 0, 1 / 8),
+)
+ERROR_DIFFUSION_KERNELS: Dict[str, Sequence[Tuple[int, int, float]]] = {
+    "floyd_steinberg": FLOYD_STEINBERG_KERNEL,
+    "atkinson": ATKINSON_KERNEL,
+}
+
+BAYER_8X8 = np.array(
+    [
+        [0, 32, 8, 40, 2, 34, 10, 42],
+        [48, 16, 56, 24, 50, 18, 58, 26],
+        [12, 44, 4, 36, 14, 46, 6, 38],
+        [60, 28, 52, 20, 62, 30, 54, 22],
+        [3, 35, 11, 43, 1, 33, 9, 41],
+        [51, 19, 59, 27, 49, 17, 57, 25],
+        [15, 47, 7, 39, 13, 45, 5, 37],
+        [63, 31, 55, 23, 61, 29, 53, 21],
+    ],
+    dtype=np.float32,
+)
+
+BINARIZE_METHODS = ("threshold", "floyd_steinberg", "atkinson", "ordered_bayer")
+
+# 誤差の配分先が行の外にはみ出しても隣の行に回り込まないよう、左右に余白列を設ける
+_PAD = 2
+
+
+class Binarizer:
+    """
+    "L" 画像を印刷用の mode "1" に変換する。帯ごとに順に渡すと、誤差拡散の誤差や
+    Bayer行列の位相を帯の境界をまたいで引き継ぐため、全体を一度に変換した結果と一致する。
+    """
+
+    def __init__(self, threshold: int, method: str = "threshold") -> None:
+        method = method.lower()
+        if method not in BINARIZE_METHODS:
+            raise ValueError(f"未知の2値化方式です: {method} ({' / '.join(BINARIZE_METHODS)})")
+        self.threshold = threshold
+        self.method = method
+        self._row = 0
+        self._carry: Optional[np.ndarray] = None
+
+    def __call__(self, image: Image.Image) -> Image.Image:
+        gray = image.convert("L")
+        threshold = self.threshold
+        if self.method == "threshold":
+            result = gray.point(lambda x: 0 if x < threshold else 255, mode="1")
+        elif self.method == "ordered_bayer":
+            result = self._ordered_bayer(gray)
+        else:
+            result = self._error_diffusion(gray, ERROR_DIFFUSION_KERNELS[self.method])
+        self._row += gray.height
+        return result
+
+    def _ordered_bayer(self, gray: Image.Image) -> Image.Image:
+        values = np.asarray(gray, dtype=np.float32)
+        height, width = values.shape
+        # 行列の平均が output.threshold になるようにずらす
+        levels = (BAYER_8X8 + 0.5) * (255.0 / 64.0) + (self.threshold - 127.5)
+        rows = (np.arange(height) + self._row) % 8
+        tiled = levels[rows][:, np.arange(width) % 8]
+        return Image.fromarray(values >= tiled)
+
+    def _error_diffusion(self, gray: Image.Image, kernel: Sequence[Tuple[int, int, float]]) -> Image.Image:
+        """
+        x + 2y が等しい画素同士は互いの誤差に依存しないため、その斜めの列（wavefront）
+        ごとにまとめて計算する。余白付きの1次元配列上では、各列は等間隔のスライスになる。
+        """
+        width, height = gray.size
+        padded_width = width + _PAD * 2
+        depth = max(dy for dy, _, _ in kernel)
+
+        buf = np.zeros((height + depth, padded_width), dtype=np.float32)
+        buf[:height, _PAD : _PAD + width] = np.asarray(gray, dtype=np.float32)
+        if self._carry is not None:
+            buf[:depth] += self._carry
+        flat = buf.reshape(-1)
+        out = np.zeros_like(flat, dtype=bool)
+
+        stride = padded_width - 2
+        offsets = [dy * padded_width + dx for dy, dx, _ in kernel]
+        weights = np.array([[weight] for _, _, weight in kernel], dtype=np.float32)
+        threshold = np.float32(self.threshold)
+        # 1ステップあたりの一時配列の確保を避けるため、作業領域を使い回す
+        lane = min(height, width // 2 + 1)
+        error_buf = np.empty(lane, dtype=np.float32)
+        share_buf = np.empty((len(kernel), lane), dtype=np.float32)
+        for t in range(width + 2 * (height - 1)):
+            y_start = max(0, (t - width + 2) // 2)
+            y_stop = min(height - 1, t // 2)
+            if y_start > y_stop:
+                continue
+            count = y_stop - y_start + 1
+            start = y_start * stride + t + _PAD
+            stop = y_stop * stride + t + _PAD + 1
+            values = flat[start:stop:stride]
+            white = out[start:stop:stride]
+            np.greater_equal(values, threshold, out=white)
+            error = error_buf[:count]
+            np.multiply(white, 255, out=error)
+            np.subtract(values, error, out=error)
+            shares = share_buf[:, :count]
+            np.multiply(weights, error, out=shares)
+            for offset, share in zip(offsets, shares):
+                target = flat[start + offset : stop + offset : stride]
+                np.add(target, share, out=target)
+
+        # 次の帯の先頭行に引き継ぐ誤差（余白列に溜まった分は捨てる）
+        self._carry = buf[height:].copy()
+        self._carry[:, :_PAD] = 0
+        self._carry[:, _PAD + width :] = 0
+        bits = out.reshape(buf.shape)[:height, _PAD : _PAD + width]
+        return Image.fromarray(np.ascontiguousarray(bits))
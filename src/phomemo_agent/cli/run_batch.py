@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import TextIO
+
+from ..batch import BATCH_FORMATS, detect_format, iter_rows
+from ..constants import DEFAULT_PREFETCH_JOBS
+from ..pipeline import LayoutJobPipeline
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="1つのレイアウトテンプレートにCSV/NDJSONの各行を差し込んで連続印刷する"
+    )
+    parser.add_argument("template", type=Path, help="{{field}} を含むレイアウトJSON")
+    parser.add_argument("data", help="CSV / NDJSON ファイル（- で標準入力）")
+    parser.add_argument(
+        "--format",
+        choices=BATCH_FORMATS,
+        help="データ形式 (default: 拡張子から判定。.csv 以外は ndjson)",
+    )
+    parser.add_argument(
+        "--print",
+        action="store_true",
+        default=False,
+        help="プリンタへ送信する（省略時はプレビューのみ）",
+    )
+    parser.add_argument("--encoding", default="utf-8", help="テキスト/データのエンコーディング")
+    parser.add_argument("--stop-on-error", action="store_true", help="失敗した行で打ち切る")
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=DEFAULT_PREFETCH_JOBS,
+        help=f"送信中に何行先まで合成しておくか（0 で逐次、既定 {DEFAULT_PREFETCH_JOBS}）",
+    )
+    parser.add_argument("--output", type=Path, help="結果NDJSONの保存先（省略時は標準出力）")
+    return parser.parse_args()
+
+
+def _run(args: argparse.Namespace, data: TextIO, out: TextIO) -> int:
+    template = json.loads(args.template.read_text(encoding="utf-8"))
+    fmt = args.format or detect_format(None if args.data == "-" else Path(args.data))
+    pipeline = LayoutJobPipeline()
+    failures = 0
+    try:
+        for result in pipeline.run_batch(
+            template,
+            iter_rows(data, fmt),
+            base_dir=args.template.parent,
+            encoding=args.encoding,
+            dry_run=not args.print,
+            stop_on_error=args.stop_on_error,
+            prefetch=args.prefetch,
+        ):
+            failures += not result["ok"]
+            # 1行ごとに書き出す（パイプ先で逐次処理できるように flush する）
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        pipeline.close()
+    return 1 if failures else 0
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.template.exists():
+        print("error: template not found", file=sys.stderr)
+        return 2
+
+    out = args.output.open("w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.data == "-":
+            return _run(args, sys.stdin, out)
+        with open(args.data, encoding=args.encoding, newline="") as data:
+            return _run(args, data, out)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
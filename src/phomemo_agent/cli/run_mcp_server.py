@@ -1,7 +1,11 @@
 from __future__ import annotations
 
 import argparse
+import json
+import os
+from pathlib import Path
 
+from ..constants import DEFAULT_MCP_CONCURRENCY, DEFAULT_RENDER_PROCESSES
 from ..mcp.layout_server import run_server
 
 
@@ -15,12 +19,47 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument("--host", default="127.0.0.1", help="ホスト (sse/http時のみ)")
     parser.add_argument("--port", type=int, default=8000, help="ポート (sse/http時のみ)")
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=int(os.getenv("PHOMEMO_MCP_MAX_CONCURRENCY", DEFAULT_MCP_CONCURRENCY)),
+        help=f"同時に合成・送信するジョブ数 (default: PHOMEMO_MCP_MAX_CONCURRENCY または {DEFAULT_MCP_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--render-processes",
+        type=int,
+        default=int(os.getenv("PHOMEMO_RENDER_PROCESSES", DEFAULT_RENDER_PROCESSES)),
+        help="合成・2値化を行うワーカープロセス数。0ならサーバーのプロセス内で行う "
+        f"(default: PHOMEMO_RENDER_PROCESSES または {DEFAULT_RENDER_PROCESSES})",
+    )
+    parser.add_argument(
+        "--warm-font",
+        action="append",
+        default=[],
+        help="ワーカープロセスの起動時に読み込んでおくフォント（複数指定可。フォールバック・絵文字の設定なし）",
+    )
+    parser.add_argument(
+        "--warm-job",
+        type=Path,
+        action="append",
+        default=[],
+        help="ワーカープロセスの起動時に、このジョブJSONのテキストレイヤーが使うフォントを"
+        "フォールバック・絵文字の設定込みで読み込んでおく（複数指定可）",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    run_server(transport=args.transport, host=args.host, port=args.port)
+    run_server(
+        transport=args.transport,
+        host=args.host,
+        port=args.port,
+        max_concurrency=args.max_concurrency,
+        render_processes=args.render_processes,
+        warm_fonts=args.warm_font,
+        warm_jobs=[json.loads(path.read_text(encoding="utf-8")) for path in args.warm_job],
+    )
 
 
 if __name__ == "__main__":
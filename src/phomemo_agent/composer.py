@@ -1,9 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Dict, List, Sequence, Tuple
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 from PIL import Image, ImageColor
 from imagetext_py import (
     Canvas,
@@ -19,7 +24,19 @@ from imagetext_py import (
     text_wrap,
 )
 
-from .constants import CANVAS_WIDTH
+from .binarize import Binarizer
+from .cache import LRUCache
+from .constants import (
+    CANVAS_WIDTH,
+    DEFAULT_FONT_CACHE_SIZE,
+    DEFAULT_IMAGE_CACHE_BYTES,
+    DEFAULT_PREVIEW_WIDTH,
+    DEFAULT_TEXT_LAYOUT_CACHE_SIZE,
+    MAX_RENDER_WORKERS,
+)
+from .timing import measure
+
+PREVIEW_MODES = ("full", "bw", "thumbnail")
 
 ALIGN_MAP = {
     "left": TextAlign.Left,
@@ -50,10 +67,68 @@ EMOJI_SOURCE_MAP = {
 }
 
 
+# プロセス全体で共有するFontキャッシュ（大きな.ttcの再パースを避ける）
+FONT_CACHE: LRUCache[Font] = LRUCache(DEFAULT_FONT_CACHE_SIZE)
+# 折り返し結果と高さのキャッシュ（同じ文言の再レンダリングで text_wrap を省く）
+TEXT_LAYOUT_CACHE: LRUCache[Tuple[Tuple[str, ...], float]] = LRUCache(DEFAULT_TEXT_LAYOUT_CACHE_SIZE)
+
+
+def image_nbytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+# 画像レイヤーの最終結果（デコード・リサイズ・不透明度適用後）のキャッシュ。メモリ予算で管理する。
+# 保持している画像は共有されるため、呼び出し側で書き換えないこと。
+IMAGE_CACHE: LRUCache[Image.Image] = LRUCache(
+    max_bytes=DEFAULT_IMAGE_CACHE_BYTES, sizeof=image_nbytes
+)
+
+
 @dataclass
 class RenderedLayer:
-    image: Image.Image
+    # 帯ごとに描くレイヤー（bands あり）では None
+    image: Optional[Image.Image]
     position: Tuple[int, int]
+    # 描画の内訳（秒）: read_sec / font_sec / layout_sec / draw_sec / load_sec / total_sec
+    timings: Dict[str, float] = field(default_factory=dict)
+    # ストリーミング用: 全体の画像を持たず、合成する帯にかかる行だけを描くテキスト
+    bands: Optional["TextBands"] = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        if self.image is not None:
+            return self.image.size
+        return self.bands.width, self.bands.height
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        """レイヤー内の top 行目から bottom 行目の手前までの画像。"""
+        if self.image is None:
+            return self.bands.rows(top, bottom)
+        if top <= 0 and bottom >= self.image.height:
+            return self.image
+        return self.image.crop((0, top, self.image.width, bottom))
+
+
+@dataclass
+class CanvasPlan:
+    """描画済みレイヤーと最終キャンバスの寸法。貼り合わせ前の状態。"""
+
+    width: int
+    height: int
+    background: Tuple[int, int, int, int]
+    layers: List[RenderedLayer]
+    output_cfg: Dict
+    # "RGBA" もしくは "L"（モノクロ合成。レイヤーは "LA" で保持する）
+    mode: str = "RGBA"
+    # color_mode="auto" でモノクロ合成に切り替えてよいジョブか（as_mono で切り替える）
+    mono_eligible: bool = False
+    # 先頭 base_layers 枚を合成済みの下地（モード → 画像。CompiledTemplate が用意する）。
+    # paste_layers は下地を写してから残りのレイヤーだけを重ねる
+    base: Dict[str, Image.Image] = field(default_factory=dict)
+    base_layers: int = 0
+    # レイヤーを帯ごとに描く・変換するプラン（ストリーミング用。prepare_canvas(banded=True) で作る）。
+    # as_mono はレイヤーを変換せず、paste_layers が帯の分だけ "LA" にする
+    banded: bool = False
 
 
 def hex_to_rgba(value: str) -> Tuple[int, int, int, int]:
@@ -61,60 +136,74 @@ def hex_to_rgba(value: str) -> Tuple[int, int, int, int]:
     return tuple(color)
 
 
-def build_font(
-    font_path: str,
-    fallback_fonts: Sequence[str],
-    emoji_cfg: Dict,
-) -> Font:
+def _file_mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return -1.0
+
+
+def _emoji_settings(emoji_cfg: Dict) -> Tuple:
     shift = emoji_cfg.get("shift", [0, 0])
     shift_tuple = (int(round(shift[0])), int(round(shift[1]))) if len(shift) == 2 else (0, 0)
-
     source_name = str(emoji_cfg.get("source", "google")).lower()
-    source_factory = EMOJI_SOURCE_MAP.get(source_name, EmojiSource.Google)
+    if source_name not in EMOJI_SOURCE_MAP:
+        source_name = "google"
+    return (
+        float(emoji_cfg.get("scale", 1.0)),
+        shift_tuple,
+        bool(emoji_cfg.get("parse_shortcodes", True)),
+        bool(emoji_cfg.get("parse_discord", False)),
+        source_name,
+    )
 
+
+def font_cache_key(font_path: str, fallback_fonts: Sequence[str], emoji_cfg: Dict) -> Hashable:
+    paths = [str(font_path), *[str(p) for p in fallback_fonts]]
+    return (
+        paths[0],
+        tuple(paths[1:]),
+        _emoji_settings(emoji_cfg),
+        tuple(_file_mtime(p) for p in paths),
+    )
+
+
+def _load_font(font_path: str, fallback_fonts: Sequence[str], emoji_cfg: Dict) -> Font:
+    scale, shift, parse_shortcodes, parse_discord, source_name = _emoji_settings(emoji_cfg)
     emoji_options = EmojiOptions(
-        scale=emoji_cfg.get("scale", 1.0),
-        shift=shift_tuple,
-        parse_shortcodes=emoji_cfg.get("parse_shortcodes", True),
-        parse_discord_emojis=emoji_cfg.get("parse_discord", False),
-        source=source_factory(),
+        scale=scale,
+        shift=shift,
+        parse_shortcodes=parse_shortcodes,
+        parse_discord_emojis=parse_discord,
+        source=EMOJI_SOURCE_MAP[source_name](),
     )
     return Font(str(font_path), fallbacks=[str(p) for p in fallback_fonts], emoji_options=emoji_options)
 
 
-def ensure_text(layer: Dict, encoding: str) -> str:
-    if "text" in layer and layer["text"] is not None:
-        return layer["text"]
-    if "text_file" in layer:
-        return Path(layer["text_file"]).read_text(encoding=layer.get("encoding", encoding))
-    raise ValueError("text layer には text または text_file の指定が必要です")
-
+def build_font(
+    font_path: str,
+    fallback_fonts: Sequence[str],
+    emoji_cfg: Dict,
+) -> Font:
+    """
+    Fontを FONT_CACHE から取得する。フォントファイルが更新されていればキーが変わり読み直す。
+    """
+    return _cached_font(font_path, fallback_fonts, emoji_cfg)[1]
 
-def render_text_layer(
-    layer: Dict,
-    canvas_width: int,
-    global_defaults: Dict,
-    encoding: str,
-) -> RenderedLayer:
-    text = ensure_text(layer, encoding=layer.get("encoding", encoding))
-    font_path = layer.get("font_path") or global_defaults.get("font_path")
-    if not font_path:
-        raise ValueError("font_path が指定されていません (canvas.font_path もしくは layer.font_path が必要)")
-    fallback_fonts = [
-        str(p) for p in layer.get("fallback_fonts", global_defaults.get("fallback_fonts", []))
-    ]
-    emoji_cfg = {**global_defaults.get("emoji", {}), **layer.get("emoji", {})}
-    font = build_font(font_path, fallback_fonts, emoji_cfg)
 
-    font_size = layer.get("font_size", global_defaults.get("font_size", 32))
-    line_spacing = layer.get("line_spacing", global_defaults.get("line_spacing", 1.2))
-    wrap_style_name = layer.get("wrap_style", global_defaults.get("wrap_style", "character"))
-    wrap_style = WRAP_STYLE_MAP.get(wrap_style_name.lower(), WrapStyle.Character)
+def _cached_font(font_path: str, fallback_fonts: Sequence[str], emoji_cfg: Dict) -> Tuple[Hashable, Font]:
+    key = font_cache_key(font_path, fallback_fonts, emoji_cfg)
+    return key, FONT_CACHE.get_or_create(key, lambda: _load_font(font_path, fallback_fonts, emoji_cfg))
 
-    margin = global_defaults.get("margin", 20)
-    width = layer.get("width", canvas_width - margin * 2)
-    width = max(1, int(width))
 
+def _wrap_and_measure(
+    text: str,
+    width: int,
+    font_size: float,
+    line_spacing: float,
+    wrap_style: WrapStyle,
+    font: Font,
+) -> Tuple[Tuple[str, ...], float]:
     lines: List[str] = []
     paragraphs = text.splitlines() or [""]
     for paragraph in paragraphs:
@@ -140,10 +229,98 @@ def render_text_layer(
         line_spacing=line_spacing,
         draw_emojis=True,
     )
-    height = max(int(text_height), int(font_size))
+    return tuple(lines), text_height
+
+
+def layout_text(
+    text: str,
+    width: int,
+    font_size: float,
+    line_spacing: float,
+    wrap_style_name: str,
+    font: Font,
+    font_key: Hashable,
+) -> Tuple[List[str], float]:
+    """
+    折り返し済みの行と描画高さを返す。結果は TEXT_LAYOUT_CACHE に保持される。
+    """
+    wrap_style_name = wrap_style_name.lower()
+    wrap_style = WRAP_STYLE_MAP.get(wrap_style_name, WrapStyle.Character)
+    key = (text, width, font_size, line_spacing, wrap_style_name, font_key)
+    lines, text_height = TEXT_LAYOUT_CACHE.get_or_create(
+        key,
+        lambda: _wrap_and_measure(text, width, font_size, line_spacing, wrap_style, font),
+    )
+    return list(lines), text_height
+
+
+def cache_stats() -> Dict:
+    return {
+        "fonts": FONT_CACHE.stats(),
+        "text_layout": TEXT_LAYOUT_CACHE.stats(),
+        "images": IMAGE_CACHE.stats(),
+    }
+
+
+def ensure_text(layer: Dict, encoding: str) -> str:
+    if "text" in layer and layer["text"] is not None:
+        return layer["text"]
+    if "text_file" in layer:
+        return Path(layer["text_file"]).read_text(encoding=layer.get("encoding", encoding))
+    raise ValueError("text layer には text または text_file の指定が必要です")
 
-    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-    canvas = Canvas.from_image(img)
+
+def layer_font_args(layer: Dict, global_defaults: Dict) -> Tuple[str, List[str], Dict]:
+    """テキストレイヤーが使うフォントの (font_path, fallback_fonts, emoji設定)（build_font の引数）。"""
+    font_path = layer.get("font_path") or global_defaults.get("font_path")
+    if not font_path:
+        raise ValueError("font_path が指定されていません (canvas.font_path もしくは layer.font_path が必要)")
+    fallback_fonts = [
+        str(p) for p in layer.get("fallback_fonts", global_defaults.get("fallback_fonts", []))
+    ]
+    emoji_cfg = {**global_defaults.get("emoji", {}), **layer.get("emoji", {})}
+    return font_path, fallback_fonts, emoji_cfg
+
+
+def job_fonts(config: Dict) -> List[Tuple[str, List[str], Dict]]:
+    """ジョブのテキストレイヤーが使うフォントを重複なく返す（フォントの事前読み込み用）。"""
+    global_defaults = canvas_defaults(config.get("canvas", {}))
+    fonts: Dict[Hashable, Tuple[str, List[str], Dict]] = {}
+    for layer in config.get("layers", []):
+        if layer.get("type") == "text":
+            args = layer_font_args(layer, global_defaults)
+            fonts.setdefault(font_cache_key(*args), args)
+    return list(fonts.values())
+
+
+def render_text_layer(
+    layer: Dict,
+    canvas_width: int,
+    global_defaults: Dict,
+    encoding: str,
+    banded: bool = False,
+) -> RenderedLayer:
+    """banded=True なら描画は合成時まで遅らせ、帯ごとにかかる行だけを描く（TextBands）。"""
+    timings: Dict[str, float] = {}
+    with measure(timings, "read_sec"):
+        text = ensure_text(layer, encoding=layer.get("encoding", encoding))
+    font_path, fallback_fonts, emoji_cfg = layer_font_args(layer, global_defaults)
+    with measure(timings, "font_sec"):
+        font_key, font = _cached_font(font_path, fallback_fonts, emoji_cfg)
+
+    font_size = layer.get("font_size", global_defaults.get("font_size", 32))
+    line_spacing = layer.get("line_spacing", global_defaults.get("line_spacing", 1.2))
+    wrap_style_name = layer.get("wrap_style", global_defaults.get("wrap_style", "character"))
+
+    margin = global_defaults.get("margin", 20)
+    width = layer.get("width", canvas_width - margin * 2)
+    width = max(1, int(width))
+
+    with measure(timings, "layout_sec"):
+        lines, text_height = layout_text(
+            text, width, font_size, line_spacing, wrap_style_name, font, font_key
+        )
+    height = max(int(text_height), int(font_size))
 
     stroke_cfg = layer.get("stroke") or {}
     stroke_width = stroke_cfg.get("width", 0)
@@ -153,28 +330,92 @@ def render_text_layer(
 
     align = ALIGN_MAP.get(layer.get("align", "left").lower(), TextAlign.Left)
 
-    draw_text_multiline(
-        canvas=canvas,
-        lines=lines,
-        x=0,
-        y=0,
-        ax=0.0,
-        ay=0.0,
-        width=width,
-        size=font_size,
-        font=font,
-        fill=Paint.Color(Color(0, 0, 0, 255)),
-        line_spacing=line_spacing,
-        align=align,
-        stroke=stroke,
-        stroke_color=stroke_paint,
-        draw_emojis=True,
+    text_bands = TextBands(
+        lines, width, height, font, font_size, line_spacing, align, stroke, stroke_paint, timings
     )
-
     position = layer.get("position", {})
     x = int(position.get("x", margin))
     y = int(position.get("y", margin))
-    return RenderedLayer(canvas.to_image(), (x, y))
+    if banded:
+        return RenderedLayer(None, (x, y), timings, bands=text_bands)
+    return RenderedLayer(text_bands.rows(0, height), (x, y), timings)
+
+
+class TextBands:
+    """
+    折り返し済みのテキストを、帯（レイヤー内の行範囲）ごとに描く。
+    帯にかかる行（前後の余白 pad の分を含む）を1回の draw_text_multiline でまとめて描くため、
+    行をまたいで重なる字形（アクセント・ディセンダ・縁取り）も全体を1回で描いたときと同じ重なり方になる。
+    行の位置は imagetext と同じく float32 で行送りを足し上げて求める。
+    レイヤー全体（rows(0, height)）は従来どおり全行を1回で描く。
+    """
+
+    def __init__(
+        self,
+        lines: Sequence[str],
+        width: int,
+        height: int,
+        font: Font,
+        font_size: float,
+        line_spacing: float,
+        align: TextAlign,
+        stroke: Optional[float],
+        stroke_paint: Optional[Paint],
+        timings: Dict[str, float],
+    ) -> None:
+        self.lines = list(lines)
+        self.width = width
+        self.height = height
+        self.font = font
+        self.font_size = font_size
+        self.line_spacing = line_spacing
+        self.align = align
+        self.stroke = stroke
+        self.stroke_paint = stroke_paint
+        self.timings = timings
+        # imagetext は y に float32 の行送り (font_size * line_spacing) を1行ずつ足していく
+        advance = np.float32(font_size) * np.float32(line_spacing)
+        self.line_height = float(advance)
+        self.offsets = np.concatenate(
+            ([0.0], np.cumsum(np.full(max(0, len(self.lines) - 1), advance, dtype=np.float32)))
+        ).astype(np.float64)
+        # 行の枠からはみ出す字形（アクセント・ディセンダ・縁取り）が収まるだけの余白
+        self.pad = 2 * math.ceil(font_size) + 2 * math.ceil(stroke or 0)
+
+    def _draw(self, lines: Sequence[str], y: float, height: int) -> Image.Image:
+        canvas = Canvas.from_image(Image.new("RGBA", (self.width, max(1, height)), (0, 0, 0, 0)))
+        with measure(self.timings, "draw_sec"):
+            draw_text_multiline(
+                canvas=canvas,
+                lines=list(lines),
+                x=0,
+                y=y,
+                ax=0.0,
+                ay=0.0,
+                width=self.width,
+                size=self.font_size,
+                font=self.font,
+                fill=Paint.Color(Color(0, 0, 0, 255)),
+                line_spacing=self.line_spacing,
+                align=self.align,
+                stroke=self.stroke,
+                stroke_color=self.stroke_paint,
+                draw_emojis=True,
+            )
+            return canvas.to_image()
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        """レイヤー内の top 行目から bottom 行目の手前まで（RGBA）。帯にかかる行だけを描く。"""
+        top, bottom = max(0, top), min(self.height, bottom)
+        if top == 0 and bottom == self.height:
+            return self._draw(self.lines, 0, self.height)
+        # 行 k が描く範囲は offsets[k] - pad から offsets[k] + line_height + pad まで
+        first = int(np.searchsorted(self.offsets, top - self.pad - self.line_height, side="right"))
+        last = int(np.searchsorted(self.offsets, bottom + self.pad, side="left"))
+        if first >= last:
+            return Image.new("RGBA", (self.width, max(0, bottom - top)), (0, 0, 0, 0))
+        band = self._draw(self.lines[first:last], self.offsets[first] - top, bottom - top)
+        return band if band.height == bottom - top else band.crop((0, 0, self.width, bottom - top))
 
 
 def render_image_layer(layer: Dict) -> RenderedLayer:
@@ -183,11 +424,28 @@ def render_image_layer(layer: Dict) -> RenderedLayer:
     path = Path(layer["path"])
     if not path.exists():
         raise FileNotFoundError(f"画像が見つかりません: {path}")
-    img = Image.open(path).convert("RGBA")
-
+    stat = path.stat()
     max_width = layer.get("max_width")
     max_height = layer.get("max_height")
     scale = layer.get("scale")
+    opacity = layer.get("opacity", 1.0)
+
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size, scale, max_width, max_height, opacity)
+    timings: Dict[str, float] = {}
+    # キャッシュヒット時はほぼ0（デコード・リサイズ済みの画像を使い回す）
+    with measure(timings, "load_sec"):
+        img = IMAGE_CACHE.get_or_create(
+            key, lambda: _load_image_asset(path, scale, max_width, max_height, opacity)
+        )
+
+    position = layer.get("position", {})
+    x = int(position.get("x", 0))
+    y = int(position.get("y", 0))
+    return RenderedLayer(img, (x, y), timings)
+
+
+def _load_image_asset(path: Path, scale, max_width, max_height, opacity) -> Image.Image:
+    img = Image.open(path).convert("RGBA")
 
     if scale:
         img = img.resize(
@@ -205,15 +463,10 @@ def render_image_layer(layer: Dict) -> RenderedLayer:
             ratio = max_height / img.height
             img = img.resize((int(img.width * ratio), int(max_height)), Image.LANCZOS)
 
-    opacity = layer.get("opacity", 1.0)
     if opacity < 1.0:
         alpha = img.split()[-1].point(lambda p: int(p * opacity))
         img.putalpha(alpha)
-
-    position = layer.get("position", {})
-    x = int(position.get("x", 0))
-    y = int(position.get("y", 0))
-    return RenderedLayer(img, (x, y))
+    return img
 
 
 def slice_image(image: Image.Image, max_height: int) -> List[Image.Image]:
@@ -226,13 +479,112 @@ def slice_image(image: Image.Image, max_height: int) -> List[Image.Image]:
     return slices
 
 
-def to_thermal_ready(image: Image.Image, threshold: int) -> Image.Image:
-    gray = image.convert("L")
-    return gray.point(lambda x: 0 if x < threshold else 255, mode="1")
-
-
-def compose_canvas(config: Dict, encoding: str = "utf-8") -> Tuple[Image.Image, Dict]:
-    canvas_cfg = config.get("canvas", {})
+def make_preview(image: Image.Image, mode: str = "full", width: int = DEFAULT_PREVIEW_WIDTH) -> Image.Image:
+    """
+    mode: "full"（そのまま） / "bw"（2値画像） / "thumbnail"（幅 width に縮小したグレースケール）
+    """
+    if mode not in PREVIEW_MODES:
+        raise ValueError(f"未知のプレビュー方式です: {mode} ({' / '.join(PREVIEW_MODES)})")
+    if mode == "bw" and image.mode != "1":
+        return image.convert("1")
+    if mode == "thumbnail" and image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        # 1bit画像を縮小すると網点が灰色になり、印字の濃さの見当がつく
+        return image.convert("L").resize((width, height), resample=Image.BOX)
+    return image
+
+
+def to_thermal_ready(image: Image.Image, threshold: int, method: str = "threshold") -> Image.Image:
+    """
+    method: "threshold" | "floyd_steinberg" | "atkinson" | "ordered_bayer"
+    """
+    return Binarizer(threshold, method)(image)
+
+
+def render_layer(layer: Dict, global_defaults: Dict, encoding: str, banded: bool = False) -> RenderedLayer:
+    layer_type = layer.get("type")
+    started = time.perf_counter()
+    if layer_type == "text":
+        rendered = render_text_layer(layer, CANVAS_WIDTH, global_defaults, encoding, banded)
+    elif layer_type == "image":
+        rendered = render_image_layer(layer)
+    else:
+        raise ValueError(f"未知のレイヤーtypeです: {layer_type}")
+    rendered.timings["total_sec"] = time.perf_counter() - started
+    return rendered
+
+
+def render_layers(
+    layers: Sequence[Dict],
+    global_defaults: Dict,
+    encoding: str,
+    workers: int = 1,
+    banded: bool = False,
+) -> List[RenderedLayer]:
+    """
+    各レイヤーを描画する。workers>1 ならスレッドプールで並列に描画する
+    （imagetext/Pillowの重い処理はネイティブ側で行われる）。結果は常にレイヤー順。
+    並列数は MAX_RENDER_WORKERS までに抑える。
+    """
+    if workers <= 1 or len(layers) <= 1:
+        return [render_layer(layer, global_defaults, encoding, banded) for layer in layers]
+    with ThreadPoolExecutor(max_workers=min(workers, len(layers), MAX_RENDER_WORKERS)) as executor:
+        return list(executor.map(lambda layer: render_layer(layer, global_defaults, encoding, banded), layers))
+
+
+def compose_canvas(
+    config: Dict,
+    encoding: str = "utf-8",
+    workers: Optional[int] = None,
+) -> Tuple[Image.Image, Dict]:
+    """
+    workers: レイヤー描画の並列数。canvas.render_workers があればそちらを優先する。
+    """
+    plan = prepare_canvas(config, encoding=encoding, workers=workers)
+    return paste_layers(plan), plan.output_cfg
+
+
+def paste_layers(plan: CanvasPlan, top: int = 0, height: Optional[int] = None) -> Image.Image:
+    """
+    キャンバスの top 行目から height 行分を合成する（省略時は全体）。
+    帯ごとに合成しても、全体を合成してから切り出した結果と同じになる。
+    """
+    if height is None:
+        height = plan.height - top
+    background = plan.background[0] if plan.mode == "L" else plan.background
+    base = Image.new(plan.mode, (plan.width, int(height)), background)
+    bottom = top + height
+    base_image = plan.base.get(plan.mode) if plan.base_layers else None
+    if base_image is not None and top < base_image.height:
+        base.paste(base_image.crop((0, top, plan.width, min(bottom, base_image.height))), (0, 0))
+    layer_mode = "LA" if plan.mode == "L" else "RGBA"
+    for rendered in plan.layers[plan.base_layers :]:
+        (x, y), layer_height = rendered.position, rendered.size[1]
+        if y >= bottom or y + layer_height <= top:
+            continue
+        # 帯にかかる行だけを取り出して重ねる（帯ごとに描くレイヤーはその行だけを描く）
+        skip = max(0, top - y)
+        img = rendered.rows(skip, min(layer_height, bottom - y))
+        if img.mode != layer_mode:
+            # banded なプランのモノクロ合成は、帯の分だけ変換する
+            img = img.convert(layer_mode)
+        base.paste(img, (x, y + skip - top), mask=img)
+    return base
+
+
+def iter_canvas_bands(plan: CanvasPlan, band_height: int) -> Iterator[Image.Image]:
+    """
+    キャンバスを band_height 行ずつ合成して返す（slice_image と同じ区切り）。
+    """
+    if band_height <= 0 or plan.height <= band_height:
+        yield paste_layers(plan)
+        return
+    for top in range(0, plan.height, band_height):
+        yield paste_layers(plan, top, min(band_height, plan.height - top))
+
+
+def canvas_defaults(canvas_cfg: Dict) -> Dict:
+    """canvas の設定からレイヤー描画の既定値を作る。"""
     global_defaults = {
         "font_path": canvas_cfg.get("font_path"),
         "fallback_fonts": [str(p) for p in canvas_cfg.get("fallback_fonts", [])],
@@ -242,38 +594,118 @@ def compose_canvas(config: Dict, encoding: str = "utf-8") -> Tuple[Image.Image,
         "margin": canvas_cfg.get("margin", 20),
         "emoji": canvas_cfg.get("emoji", {}),
     }
-
     if not global_defaults["font_path"]:
         raise ValueError("canvas.font_path は必須です")
+    return global_defaults
+
+
+def prepare_canvas(
+    config: Dict,
+    encoding: str = "utf-8",
+    workers: Optional[int] = None,
+    banded: bool = False,
+) -> CanvasPlan:
+    """
+    banded=True ならテキストレイヤーを描かずにおき、paste_layers / iter_canvas_bands で帯ごとに描く
+    （長尺のストリーミングで、全体の高さ分の画像を持たないため）。全体が要る場合は materialize する。
+    """
+    canvas_cfg = config.get("canvas", {})
+    global_defaults = canvas_defaults(canvas_cfg)
 
     layers = config.get("layers", [])
     if not layers:
         raise ValueError("layers が空です")
 
-    rendered_layers: List[RenderedLayer] = []
-    for layer in layers:
-        layer_type = layer.get("type")
-        if layer_type == "text":
-            rendered = render_text_layer(layer, CANVAS_WIDTH, global_defaults, encoding)
-        elif layer_type == "image":
-            rendered = render_image_layer(layer)
-        else:
-            raise ValueError(f"未知のレイヤーtypeです: {layer_type}")
-        rendered_layers.append(rendered)
+    workers = int(canvas_cfg.get("render_workers", workers or 1))
+    rendered_layers = render_layers(layers, global_defaults, encoding, workers, banded)
+    return build_plan(config, rendered_layers, banded=banded)
 
+
+def build_plan(
+    config: Dict,
+    rendered_layers: List[RenderedLayer],
+    base: Optional[Dict[str, Image.Image]] = None,
+    base_layers: int = 0,
+    banded: bool = False,
+) -> CanvasPlan:
+    """描画済みレイヤーからキャンバスの寸法と合成モードを決める。"""
+    canvas_cfg = config.get("canvas", {})
     height = canvas_cfg.get("height")
     if height is None:
         max_bottom = 0
         for rendered in rendered_layers:
-            img, (x, y) = rendered.image, rendered.position
-            max_bottom = max(max_bottom, y + img.height)
-        height = max_bottom + global_defaults["margin"]
+            max_bottom = max(max_bottom, rendered.position[1] + rendered.size[1])
+        height = max_bottom + canvas_cfg.get("margin", 20)
+
+    background = hex_to_rgba(canvas_cfg.get("background_color", "#FFFFFF"))
+    color_mode = str(canvas_cfg.get("color_mode", "auto")).lower()
+    plan = CanvasPlan(
+        width=CANVAS_WIDTH,
+        height=int(height),
+        background=background,
+        layers=rendered_layers,
+        output_cfg=config.get("output", {}),
+        mono_eligible=color_mode == "auto" and _is_monochrome_job(config.get("layers", []), background),
+        base=dict(base or {}),
+        base_layers=base_layers,
+        banded=banded,
+    )
+    return as_mono(plan) if color_mode == "mono" else plan
+
+
+def materialize(plan: CanvasPlan) -> CanvasPlan:
+    """banded なプランのレイヤーを全体の画像にする（回転など、全体の画像が要る経路に渡す前に使う）。"""
+    if not plan.banded:
+        return plan
+    layers: List[RenderedLayer] = []
+    for index, rendered in enumerate(plan.layers):
+        img = rendered.rows(0, rendered.size[1])
+        if plan.mode == "L" and index >= plan.base_layers and img.mode != "LA":
+            img = img.convert("LA")
+        layers.append(RenderedLayer(img, rendered.position, rendered.timings))
+    return replace(plan, layers=layers, banded=False)
+
+
+def as_mono(plan: CanvasPlan) -> CanvasPlan:
+    """
+    キャンバスを "L" で合成するプランに変換する（RGBAの1/4のデータ量）。
+    """
+    if plan.mode == "L":
+        return plan
+    if plan.banded:
+        # レイヤーは paste_layers が帯の分だけ変換する
+        return replace(plan, mode="L")
+    base = dict(plan.base)
+    if plan.base_layers and "L" not in base:
+        base["L"] = base["RGBA"].convert("L")
+    return replace(
+        plan,
+        mode="L",
+        layers=[
+            # 下地に含まれるレイヤーは貼らないので変換しない
+            rendered if index < plan.base_layers
+            else RenderedLayer(rendered.image.convert("LA"), rendered.position, rendered.timings)
+            for index, rendered in enumerate(plan.layers)
+        ],
+        base=base,
+    )
 
-    background_color = canvas_cfg.get("background_color", "#FFFFFF")
-    base = Image.new("RGBA", (CANVAS_WIDTH, int(height)), hex_to_rgba(background_color))
 
-    for rendered in rendered_layers:
-        img, (x, y) = rendered.image, rendered.position
-        base.paste(img, (x, y), mask=img)
+def _is_gray(color: Tuple[int, ...]) -> bool:
+    return color[0] == color[1] == color[2]
 
-    return base, config.get("output", {})
+
+def _is_monochrome_job(layers: Sequence[Dict], background: Tuple[int, int, int, int]) -> bool:
+    """
+    画像レイヤーが無く、背景と縁取りが無彩色なら、"L" で合成してもRGBAで合成して
+    "L" に変換した結果と一致する。
+    """
+    if background[3] != 255 or not _is_gray(background):
+        return False
+    for layer in layers:
+        if layer.get("type") != "text":
+            return False
+        stroke_cfg = layer.get("stroke") or {}
+        if stroke_cfg.get("width", 0) > 0 and not _is_gray(hex_to_rgba(stroke_cfg.get("color", "#FFFFFF"))):
+            return False
+    return True
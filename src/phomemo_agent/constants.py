@@ -4,3 +4,26 @@ CANVAS_WIDTH = 576
 DEFAULT_THRESHOLD = 170
 DEFAULT_SLICE_HEIGHT = 1400
 DEFAULT_CHUNK_ROWS = 200
+DEFAULT_WRITE_BUFFER_SIZE = 4096
+DEFAULT_IDLE_TIMEOUT = 60.0
+DEFAULT_FONT_CACHE_SIZE = 16
+DEFAULT_TEXT_LAYOUT_CACHE_SIZE = 512
+DEFAULT_IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_MIN_BLANK_ROWS = 16
+DEFAULT_PREVIEW_WIDTH = 192
+DEFAULT_RENDER_CACHE_BYTES = 32 * 1024 * 1024
+DEFAULT_RENDER_CACHE_DISK_BYTES = 256 * 1024 * 1024
+# 送信中に何スライス先まで2値化・符号化しておくか（0 で逐次）。ジョブからは MAX_PREFETCH_SLICES まで
+DEFAULT_PREFETCH_SLICES = 2
+MAX_PREFETCH_SLICES = 16
+# canvas.render_workers の上限（ジョブの指定でスレッドを際限なく作らせない）
+MAX_RENDER_WORKERS = 16
+# バッチ/ジョブキューで、送信中に何ジョブ先まで合成しておくか（0 で逐次）
+DEFAULT_PREFETCH_JOBS = 1
+# プリンタプール: 送信が何回続けて失敗したら割り当てから外すか / 外してから再び試すまでの秒数
+DEFAULT_PRINTER_MAX_FAILURES = 3
+DEFAULT_PRINTER_RETRY_AFTER = 300.0
+# MCPサーバーで同時に合成・送信するジョブ数
+DEFAULT_MCP_CONCURRENCY = 4
+# MCPサーバーで合成・2値化を行うワーカープロセス数（0 ならサーバーのプロセス内で行う）
+DEFAULT_RENDER_PROCESSES = 0
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .connection import PrinterIOError
+from .constants import DEFAULT_PREFETCH_JOBS
+from .pipeline import LayoutJobPipeline, PreparedJob, resolve_printer_target
+from .printer_pool import PrinterDispatcher, PrinterSpec
+
+QueueKey = Optional[Tuple[str, int]]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class PrintJob:
+    id: str
+    layout: Dict[str, Any]
+    dry_run: bool
+    encoding: str
+    key: QueueKey
+    # 投入前にスキーマ検証済みか（済みならワーカー側で再検証しない）
+    validated: bool = False
+    # プリンタプール使用時: 送り先に求めるタグと、割り当てられたプリンタ
+    tags: Tuple[str, ...] = ()
+    printer: Optional[PrinterSpec] = None
+    # 別のプリンタに移したときの合成済みの結果（移した先のワーカーは合成し直さずに送る）
+    prepared: Optional[PreparedJob] = None
+    status: str = QUEUED
+    stage: str = QUEUED
+    slices_sent: int = 0
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "slices_sent": self.slices_sent,
+            "dry_run": self.dry_run,
+            "printer": self.printer.name if self.printer is not None else None,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class PrintJobQueue:
+    """
+    印刷ジョブをプリンタ (address, channel) ごとのキューに積み、ワーカースレッドで順に処理する。
+    同じプリンタへ書き込むジョブは常に1つだけ。プレビューのみのジョブは専用キューで処理する。
+    prefetch_jobs>0 なら合成と送信を別スレッドに分け、送信中に次のジョブを合成しておく
+    （送信待ちで保持する合成済みジョブは高々 prefetch_jobs 件）。
+    dispatcher を渡すと、印刷ジョブの送り先をプリンタプールから選ぶ（送り先ごとに別のキュー）。
+    """
+
+    def __init__(
+        self,
+        pipeline: LayoutJobPipeline,
+        max_history: int = 256,
+        prefetch_jobs: int = DEFAULT_PREFETCH_JOBS,
+        dispatcher: Optional[PrinterDispatcher] = None,
+    ) -> None:
+        self.pipeline = pipeline
+        self.max_history = max_history
+        self.prefetch_jobs = prefetch_jobs
+        self.dispatcher = dispatcher
+        self._jobs: "OrderedDict[str, PrintJob]" = OrderedDict()
+        self._queues: Dict[QueueKey, "queue.Queue[PrintJob]"] = {}
+        self._pending: Dict[QueueKey, List[str]] = {}
+        self._workers: Dict[QueueKey, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        layout: Dict[str, Any],
+        dry_run: bool = True,
+        encoding: str = "utf-8",
+        validated: bool = False,
+        tags: Iterable[str] = (),
+    ) -> PrintJob:
+        """tags: プリンタプール使用時、これらのタグを全て持つプリンタにだけ送る。"""
+        tags = tuple(tags)
+        key, printer = self._assign(layout, dry_run, tags)
+        job = PrintJob(
+            id=uuid.uuid4().hex,
+            layout=layout,
+            dry_run=bool(dry_run),
+            encoding=encoding,
+            key=key,
+            validated=validated,
+            tags=tags,
+            printer=printer,
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+            job_queue = self._enqueue(job)
+        job_queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[PrintJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            pending = self._pending.get(job.key, [])
+            snapshot = job.snapshot()
+            snapshot["queue_depth"] = len(pending)
+            snapshot["queue_position"] = pending.index(job.id) if job.id in pending else None
+            return snapshot
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        待機中のジョブは即座に取り消す。実行中のジョブは次の段階/スライスの区切りで中断する。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+            return True
+
+    def _assign(
+        self, layout: Dict[str, Any], dry_run: bool, tags: Tuple[str, ...]
+    ) -> Tuple[QueueKey, Optional[PrinterSpec]]:
+        send_to_printer = layout.get("output", {}).get("send_to_printer", True) and not dry_run
+        if not send_to_printer:
+            return None, None
+        if self.dispatcher is not None:
+            printer = self.dispatcher.acquire(tags)
+            return (printer.address, printer.channel), printer
+        target = resolve_printer_target()
+        if not target.address:
+            # 送信時にパイプラインがエラーにするので、ここではプレビュー用キューに回す
+            return None, None
+        return (target.address, target.channel), None
+
+    def _enqueue(self, job: PrintJob) -> "queue.Queue[PrintJob]":
+        """job.key の待ち行列に加え、そのキューを返す（無ければワーカーごと作る）。_lock を持って呼ぶ。"""
+        self._pending.setdefault(job.key, []).append(job.id)
+        job_queue = self._queues.get(job.key)
+        if job_queue is None:
+            job_queue = self._queues[job.key] = queue.Queue()
+            worker = threading.Thread(
+                target=self._worker_loop,
+                args=(job_queue,),
+                name=f"phomemo-print-worker-{len(self._workers)}",
+                daemon=True,
+            )
+            self._workers[job.key] = worker
+            worker.start()
+        return job_queue
+
+    def _reroute(self, job: PrintJob, prepared: PreparedJob) -> bool:
+        """
+        割り当て後に外されたプリンタのジョブを、別の使えるプリンタのキューに積み直す（無ければそのまま試す）。
+        積み直したら True。送信は移した先のワーカーが順番どおりに行う。
+        """
+        if job.printer is None or self.dispatcher is None or self.dispatcher.is_available(job.printer):
+            return False
+        try:
+            printer = self.dispatcher.acquire(job.tags)
+        except ValueError:
+            return False
+        self.dispatcher.release(job.printer)
+        with self._lock:
+            pending = self._pending.get(job.key, [])
+            if job.id in pending:
+                pending.remove(job.id)
+            job.printer = printer
+            job.key = (printer.address, printer.channel)
+            job.prepared = prepared
+            job.stage = "rerouted"
+            job_queue = self._enqueue(job)
+        job_queue.put(job)
+        return True
+
+    def _worker_loop(self, job_queue: "queue.Queue[PrintJob]") -> None:
+        handoff: Optional["queue.Queue[Tuple[PrintJob, PreparedJob]]"] = None
+        if self.prefetch_jobs > 0:
+            handoff = queue.Queue(maxsize=self.prefetch_jobs)
+            threading.Thread(
+                target=self._transmit_loop,
+                args=(handoff,),
+                name=f"{threading.current_thread().name}-transmit",
+                daemon=True,
+            ).start()
+        while True:
+            job = job_queue.get()
+            try:
+                if job.cancel_event.is_set():
+                    if job.prepared is not None:
+                        # 移されてきたジョブは実行中扱いなので、ここで取り消しを確定する
+                        with self._lock:
+                            self._finish(job, CANCELLED)
+                    continue
+                prepared, job.prepared = job.prepared or self._prepare(job), None
+                if prepared is None:
+                    continue
+                if handoff is None:
+                    self._deliver(job, prepared)
+                else:
+                    # 合成済みで送信待ち（前のジョブの送信が終わると送られる）
+                    job.stage = "prepared"
+                    handoff.put((job, prepared))
+            finally:
+                job_queue.task_done()
+
+    def _transmit_loop(self, handoff: "queue.Queue[Tuple[PrintJob, PreparedJob]]") -> None:
+        while True:
+            job, prepared = handoff.get()
+            if job.cancel_event.is_set():
+                with self._lock:
+                    self._finish(job, CANCELLED)
+                continue
+            self._deliver(job, prepared)
+
+    def _prepare(self, job: PrintJob) -> Optional[PreparedJob]:
+        with self._lock:
+            if job.status == CANCELLED:
+                return None
+            job.status = RUNNING
+            job.started_at = time.time()
+
+        def on_progress(stage: str, details: Dict) -> None:
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            job.stage = stage
+            if "slices_sent" in details:
+                job.slices_sent = details["slices_sent"]
+
+        try:
+            return self.pipeline.prepare_config(
+                job.layout,
+                # 一時ファイル経由で実行していた頃と同じく、output.path の相対パスは一時ディレクトリ基準
+                base_dir=Path(tempfile.gettempdir()),
+                encoding=job.encoding,
+                dry_run=job.dry_run,
+                on_progress=on_progress,
+                validate=not job.validated,
+            )
+        except Exception as exc:
+            self._fail(job, exc)
+            return None
+
+    def _deliver(self, job: PrintJob, prepared: PreparedJob) -> None:
+        if self._reroute(job, prepared):
+            return
+        printer = job.printer
+        try:
+            if printer is None:
+                result = self.pipeline.deliver(prepared)
+            else:
+                result = self.pipeline.deliver(prepared, printer.address, printer.channel)
+        except Exception as exc:
+            # プリンタへの接続・書き込みの失敗だけをプリンタの失敗として数える
+            # （合成・画像の読み込み・プレビュー・設定の誤りはジョブの問題）
+            self._fail(job, exc, transmitted=False if isinstance(exc, PrinterIOError) else None)
+            return
+
+        with self._lock:
+            job.result = {
+                "preview_path": str(result.preview_path or ""),
+                "printed": result.printed,
+                "slice_heights": result.slice_heights,
+                "info": result.info,
+            }
+            self._finish(job, DONE, transmission=result.info.get("transmission"))
+
+    def _fail(self, job: PrintJob, exc: Exception, transmitted: Optional[bool] = None) -> None:
+        """transmitted=False はプリンタへの接続・書き込みの失敗（プリンタプールの失敗回数に数える）。"""
+        with self._lock:
+            if isinstance(exc, JobCancelled):
+                self._finish(job, CANCELLED)
+                return
+            job.error = str(exc)
+            self._finish(job, FAILED, transmitted=transmitted)
+
+    def _finish(
+        self,
+        job: PrintJob,
+        status: str,
+        transmitted: Optional[bool] = None,
+        transmission: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if job.printer is not None and self.dispatcher is not None and job.status not in FINISHED_STATES:
+            if transmission is not None:
+                self.dispatcher.release(
+                    job.printer,
+                    transmitted=True,
+                    nbytes=transmission.get("bytes", 0),
+                    seconds=transmission.get("elapsed_sec", 0.0),
+                )
+            else:
+                self.dispatcher.release(job.printer, transmitted=transmitted, error=job.error)
+        job.status = status
+        job.stage = status
+        job.finished_at = time.time()
+        pending = self._pending.get(job.key, [])
+        if job.id in pending:
+            pending.remove(job.id)
+
+    def _trim_history(self) -> None:
+        # 完了済みジョブを古い順に捨てる（待機中・実行中は残す）
+        excess = len(self._jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [jid for jid, job in self._jobs.items() if job.status in FINISHED_STATES][:excess]:
+            del self._jobs[job_id]
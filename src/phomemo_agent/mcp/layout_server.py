@@ -1,18 +1,38 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import json
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
 
 from mcp.server import FastMCP
 
-from ..pipeline import LayoutJobPipeline
+from ..connection import PrinterConnectionPool
+from ..constants import DEFAULT_IDLE_TIMEOUT, DEFAULT_MCP_CONCURRENCY, DEFAULT_RENDER_PROCESSES
+from ..jobs import PrintJobQueue
+from ..pipeline import LayoutJobPipeline, LayoutJobResult
+from ..printer_pool import PrinterDispatcher
+from ..render_cache import RenderCache
+from ..render_pool import ProcessRenderPool
 from ..validators import LayoutJobValidator
 
-pipeline = LayoutJobPipeline()
+# サーバーは常駐するため、プリンタ接続をジョブ間で使い回す（RFCOMM接続コストの削減）
+connections = PrinterConnectionPool(
+    idle_timeout=float(os.getenv("PHOMEMO_PRINTER_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT))
+)
+pipeline = LayoutJobPipeline(connection_pool=connections, render_cache=RenderCache.from_env())
 validator = LayoutJobValidator()
+# PHOMEMO_PRINTER_POOL があれば複数台に振り分ける（無ければ PHOMEMO_PRINTER_ADDRESS の1台）
+dispatcher = PrinterDispatcher.from_env()
+job_queue = PrintJobQueue(pipeline, dispatcher=dispatcher)
+# 合成・Bluetooth送信を行うワーカー（build_server で作る）
+render_executor: Optional[ThreadPoolExecutor] = None
+
+T = TypeVar("T")
 
 REPO_ROOT = Path(__file__).resolve().parents[3]
 SCHEMA_PATH = REPO_ROOT / "schemas" / "layout_job.schema.json"
@@ -25,6 +45,45 @@ def _read_text_if_exists(path: Path) -> str:
     return ""
 
 
+def _run_layout(
+    layout: Dict[str, Any],
+    dry_run: bool,
+    encoding: str,
+    tags: Optional[List[str]] = None,
+) -> LayoutJobResult:
+    # output.path の相対パスは従来（一時ファイル経由）と同じく一時ディレクトリ基準
+    base_dir = Path(tempfile.gettempdir())
+    send_to_printer = layout.get("output", {}).get("send_to_printer", True) and not dry_run
+    if dispatcher is None or not send_to_printer:
+        # プリンタ設定はパイプライン側で env (PHOMEMO_PRINTER_ADDRESS / PHOMEMO_PRINTER_CHANNEL) を参照する
+        return pipeline.run_config(
+            layout, base_dir=base_dir, encoding=encoding, dry_run=dry_run, validate=False
+        )
+
+    printer = dispatcher.acquire(tags or ())
+    try:
+        job = pipeline.prepare_config(
+            layout, base_dir=base_dir, encoding=encoding, dry_run=dry_run, validate=False
+        )
+    except Exception:
+        # 合成の失敗はプリンタの失敗として数えない
+        dispatcher.release(printer)
+        raise
+    try:
+        result = pipeline.deliver(job, printer.address, printer.channel)
+    except Exception as exc:
+        dispatcher.release(printer, transmitted=False, error=str(exc))
+        raise
+    transmission = result.info.get("transmission") or {}
+    dispatcher.release(
+        printer,
+        transmitted=True,
+        nbytes=transmission.get("bytes", 0),
+        seconds=transmission.get("elapsed_sec", 0.0),
+    )
+    return result
+
+
 def _printer_spec_markdown() -> str:
     return """# Phomemo M02 Pro 印刷仕様（レイアウト設計用）
 
@@ -32,6 +91,7 @@ def _printer_spec_markdown() -> str:
 - **幅は常に 576px 固定**（M02 Proの印字幅に合わせる）
 - 背景は白（#FFFFFF）、文字は黒を基本
 - 出力は最終的に**しきい値で2値化**される（`output.threshold`）
+- 写真などの階調画像は `output.binarize` でディザリングを選ぶ（`floyd_steinberg` / `atkinson` / `ordered_bayer`）
 
 ## 実寸換算（重要）
 - M02 Pro（300dpi想定）では、おおよそ **300px = 1 inch** です
@@ -46,12 +106,18 @@ def _printer_spec_markdown() -> str:
 - Bluetooth送信で途中停止する場合があるため、画像を縦方向に分割して送る
 - `output.slice_height`（例: 1400）で画像をスライス
 - `output.chunk_rows`（例: 200、1〜256）で送信ブロックを小さくする
+- `output.write_buffer_size`（既定 4096）で1回の書き込みサイズ、`output.write_interval`（秒）で書き込み間の待ちを調整する
+- 非常に長いジョブは `output.streaming: true` で帯ごとに合成・送信できる（回転なしのジョブのみ。テキストは帯にかかる行だけを描くのでメモリはほぼ一定。画像レイヤーは全体を読み込む）
+- 送信中に次のスライスを `output.prefetch_slices` 枚先（既定2）まで用意する。通常は指定不要
+- 長いジョブで印刷もする場合は `output.preview: "bw"`（印刷される2値画像）や `"thumbnail"` にするとプレビュー保存が速い
+- `output.feed_blank_rows: true` で16行以上続く白い余白を紙送りで送れる（実機での送り量が未確認のため既定は無効）
 
 ## JSONレイアウトの基本
 - `canvas` / `layers` / `output` を必ず含める
 - `layers[].type` は `text` または `image`
 - `text` レイヤーは `text` または `text_file` のどちらかを持つ
 - `image` レイヤーは `path` を持つ（ローカルファイル）
+- バッチ印刷のテンプレートでは、`{{列名}}` を含むレイヤーと `"variable": true` のレイヤーだけが行ごとに描画される（他は1回だけ描画して使い回す）
 
 ## フォント
 - `canvas.font_path` は **存在するフォントパスのみ**を指定（存在しないパスを創作しない）
@@ -75,7 +141,45 @@ def _printer_spec_markdown() -> str:
 """
 
 
-def build_server(host: str = "127.0.0.1", port: int = 8000) -> FastMCP:
+async def _offload(func: Callable[..., T], *args: Any) -> T:
+    """
+    重い処理（合成・送信）をワーカースレッドで実行する。イベントループは止まらないので、
+    他のクライアントの軽いツール呼び出し（get_printer_spec / validate_layout など）は待たされない。
+    同時に実行されるのは max_concurrency 件までで、それを超えた分はワーカーの空き待ちになる。
+    """
+    if render_executor is None:
+        raise RuntimeError("build_server の前に呼び出されました。")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, functools.partial(func, *args))
+
+
+def build_server(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    max_concurrency: int = DEFAULT_MCP_CONCURRENCY,
+    render_processes: int = DEFAULT_RENDER_PROCESSES,
+    warm_fonts: Sequence[str] = (),
+    warm_jobs: Sequence[Dict[str, Any]] = (),
+) -> FastMCP:
+    """
+    render_processes > 0 なら合成・2値化をその数のワーカープロセスで行う（複数コアを使う）。
+    ワーカーは起動時にスキーマと warm_fonts のフォント、warm_jobs のジョブが使うフォント
+    （フォールバック・絵文字の設定込み）を読み込んでおく。
+    """
+    global render_executor
+    if max_concurrency <= 0:
+        raise ValueError("max_concurrencyは1以上で指定してください。")
+    if render_processes < 0:
+        raise ValueError("render_processesは0以上で指定してください。")
+    if render_executor is not None:
+        render_executor.shutdown(wait=False)
+    render_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="phomemo-mcp")
+    if pipeline.render_pool is not None:
+        pipeline.render_pool.shutdown()
+        pipeline.render_pool = None
+    if render_processes > 0:
+        pipeline.render_pool = ProcessRenderPool(render_processes, warm_fonts=warm_fonts, warm_jobs=warm_jobs)
+        pipeline.render_pool.warm()
     server = FastMCP("PhomemoLayoutServer", host=host, port=port)
 
     # -------------------------
@@ -188,31 +292,22 @@ def build_server(host: str = "127.0.0.1", port: int = 8000) -> FastMCP:
         name="render_layout_job",
         description=(
             "Phomemo向けレイアウトJSONを検証し、プレビュー/印刷を実行します。"
-            "プリンタ設定は環境変数 PHOMEMO_PRINTER_ADDRESS / PHOMEMO_PRINTER_CHANNEL を参照します。"
+            "プリンタ設定は環境変数 PHOMEMO_PRINTER_ADDRESS / PHOMEMO_PRINTER_CHANNEL を参照します"
+            "（PHOMEMO_PRINTER_POOL があればプールから選び、tags でプリンタを絞り込めます）。"
             "注意: dry_run=true（既定）の場合はプレビューのみで printed=false になります。印刷したい場合は dry_run=false を指定してください。"
         ),
     )
-    def render_layout_job(
+    async def render_layout_job(
         layout: Dict[str, Any],
         dry_run: bool = True,
         encoding: str = "utf-8",
+        tags: Optional[List[str]] = None,
     ) -> Dict[str, Any]:
-        validator.validate(layout)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as tmp:
-            tmp_path = Path(tmp.name)
-            tmp.write(json.dumps(layout, ensure_ascii=False).encode("utf-8"))
-
-        try:
-            result = pipeline.run(
-                job_config_path=tmp_path,
-                # プリンタ設定はパイプライン側で env (PHOMEMO_PRINTER_ADDRESS / PHOMEMO_PRINTER_CHANNEL) を参照する
-                printer_address=None,
-                printer_channel=1,
-                encoding=encoding,
-                dry_run=dry_run,
-            )
-        finally:
-            tmp_path.unlink(missing_ok=True)
+        def run() -> LayoutJobResult:
+            validator.validate(layout)
+            return _run_layout(layout, dry_run, encoding, tags)
+
+        result = await _offload(run)
 
         return {
             "preview_path": str(result.preview_path or ""),
@@ -221,19 +316,96 @@ def build_server(host: str = "127.0.0.1", port: int = 8000) -> FastMCP:
             "info": result.info,
         }
 
+    @server.tool(
+        name="submit_print_job",
+        description=(
+            "レイアウトJSONを検証してジョブキューに登録し、すぐに job_id を返します（処理はバックグラウンド）。"
+            "同じプリンタへの印刷は1件ずつ順番に実行されます。進捗は get_job_status で確認してください。"
+            "プリンタプール使用時は空いているプリンタに振り分けます（tags を全て持つプリンタに限定可）。"
+            "注意: dry_run=true（既定）の場合はプレビューのみです。"
+        ),
+    )
+    def submit_print_job(
+        layout: Dict[str, Any],
+        dry_run: bool = True,
+        encoding: str = "utf-8",
+        tags: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        validator.validate(layout)
+        job = job_queue.submit(layout, dry_run=dry_run, encoding=encoding, validated=True, tags=tags or ())
+        return job_queue.status(job.id) or {"job_id": job.id}
+
+    @server.tool(
+        name="get_printer_pool_status",
+        description=(
+            "プリンタプールの各プリンタの状態（稼働/停止、待ちジョブ数、印刷数、失敗数、送信スループット）を返す。"
+            "reset に名前を渡すと、連続失敗で外したプリンタを割り当てに戻す"
+        ),
+    )
+    def get_printer_pool_status(reset: Optional[str] = None) -> Dict[str, Any]:
+        if dispatcher is None:
+            return {"enabled": False, "printers": []}
+        if reset:
+            dispatcher.reset(reset)
+        return {"enabled": True, **dispatcher.stats()}
+
+    @server.tool(
+        name="get_job_status",
+        description="submit_print_job で登録したジョブの状態（status/stage/slices_sent/queue_depth/結果）を返す",
+    )
+    def get_job_status(job_id: str) -> Dict[str, Any]:
+        status = job_queue.status(job_id)
+        if status is None:
+            raise ValueError(f"job_id が見つかりません: {job_id}")
+        return status
+
+    @server.tool(
+        name="cancel_job",
+        description="待機中のジョブを取り消す。実行中のジョブは次のスライスの区切りで中断する",
+    )
+    def cancel_job(job_id: str) -> Dict[str, Any]:
+        cancelled = job_queue.cancel(job_id)
+        status = job_queue.status(job_id)
+        if status is None:
+            raise ValueError(f"job_id が見つかりません: {job_id}")
+        return {"cancel_requested": cancelled, **status}
+
     return server
 
 
-def run_server(transport: str, host: str = "127.0.0.1", port: int = 8000) -> None:
-    server = build_server(host=host, port=port)
-    if transport == "stdio":
-        server.run(transport="stdio")
-    elif transport == "sse":
-        server.run(transport="sse")
-    elif transport in ("http", "streamable-http", "streamable_http"):
-        # mcp FastMCP uses the literal string "streamable-http" for Streamable HTTP transport.
-        # Keep "http" as a user-friendly alias.
-        server.run(transport="streamable-http")
-    else:
-        raise ValueError("transport must be 'stdio', 'sse', 'http' (alias), or 'streamable-http'")
+def run_server(
+    transport: str,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    max_concurrency: int = DEFAULT_MCP_CONCURRENCY,
+    render_processes: int = DEFAULT_RENDER_PROCESSES,
+    warm_fonts: Sequence[str] = (),
+    warm_jobs: Sequence[Dict[str, Any]] = (),
+) -> None:
+    server = build_server(
+        host=host,
+        port=port,
+        max_concurrency=max_concurrency,
+        render_processes=render_processes,
+        warm_fonts=warm_fonts,
+        warm_jobs=warm_jobs,
+    )
+    try:
+        if transport == "stdio":
+            server.run(transport="stdio")
+        elif transport == "sse":
+            server.run(transport="sse")
+        elif transport in ("http", "streamable-http", "streamable_http"):
+            # mcp FastMCP uses the literal string "streamable-http" for Streamable HTTP transport.
+            # Keep "http" as a user-friendly alias.
+            server.run(transport="streamable-http")
+        else:
+            raise ValueError("transport must be 'stdio', 'sse', 'http' (alias), or 'streamable-http'")
+    finally:
+        if render_executor is not None:
+            render_executor.shutdown(wait=False, cancel_futures=True)
+        if pipeline.render_pool is not None:
+            pipeline.render_pool.shutdown()
+        pipeline.close()
+        connections.close_all()
 
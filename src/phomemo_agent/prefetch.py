@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
+# 消費側が止まったかを確認する間隔（秒）
+_POLL_SEC = 0.1
+
+
+def prefetch(items: Iterable[T], depth: int, name: str = "phomemo-prefetch") -> Iterator[T]:
+    """
+    items を別スレッドで取り出し、長さ depth のキューを介して順に返す（生産者/消費者）。
+    キューが満杯の間は生産側が待つので、先に用意される要素は高々 depth 個。
+    生産側の例外は、その位置で消費側に送出される。消費側が途中でやめると（close/例外）、
+    生産側は取り出し中の要素を終えたところで止まる。depth<=0 なら同じスレッドでそのまま返す。
+    """
+    if depth <= 0:
+        yield from items
+        return
+
+    buffer: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=_POLL_SEC)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+        except BaseException as exc:
+            put((_END, exc))
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        put((_END, None))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
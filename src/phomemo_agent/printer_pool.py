@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .constants import DEFAULT_PRINTER_MAX_FAILURES, DEFAULT_PRINTER_RETRY_AFTER
+
+DISPATCH_POLICIES = ("shortest_queue", "round_robin")
+
+
+@dataclass(frozen=True)
+class PrinterSpec:
+    address: str
+    channel: int = 1
+    # ジョブ側で指定したタグを全て持つプリンタだけに割り当てる（例: "station-a", "large-label"）
+    tags: Tuple[str, ...] = ()
+    # 状態表示用の名前（MACアドレスは返さないため）
+    name: str = ""
+
+
+def parse_printer_pool(value: str) -> List[PrinterSpec]:
+    """
+    プリンタプールの設定を読む。value はJSON文字列（[ で始まる）か、JSONファイルのパス。
+    JSONは [{"address": "...", "channel": 1, "tags": ["..."], "name": "..."}, ...] の形式。
+    """
+    text = value.strip()
+    if not text.startswith("["):
+        path = Path(text).expanduser()
+        if not path.exists():
+            raise ValueError(f"プリンタプールの設定ファイルが見つかりません: {path}")
+        text = path.read_text(encoding="utf-8")
+    try:
+        entries = json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"プリンタプールの設定を解析できません: {exc}") from None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("プリンタプールは1台以上のプリンタの配列で指定してください。")
+
+    printers: List[PrinterSpec] = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get("address"):
+            raise ValueError(f"プリンタプールの{index}番目に address がありません。")
+        tags = entry.get("tags", [])
+        if isinstance(tags, str):
+            tags = [tags]
+        printers.append(
+            PrinterSpec(
+                address=str(entry["address"]),
+                channel=int(entry.get("channel", 1)),
+                tags=tuple(str(tag) for tag in tags),
+                name=str(entry.get("name") or f"printer{index}"),
+            )
+        )
+    keys = [(printer.address, printer.channel) for printer in printers]
+    if len(set(keys)) != len(keys):
+        raise ValueError("プリンタプールに同じ (address, channel) が重複しています。")
+    return printers
+
+
+@dataclass
+class _PrinterState:
+    # 割り当て済みで終わっていないジョブ数（待機中 + 実行中）
+    queued: int = 0
+    dispatched: int = 0
+    jobs_done: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    # 連続失敗で外した時刻（None なら稼働中）
+    unhealthy_since: Optional[float] = None
+    bytes_sent: int = 0
+    busy_sec: float = 0.0
+    last_error: Optional[str] = None
+    order: int = 0
+
+
+class PrinterDispatcher:
+    """
+    プリンタプールからジョブの送り先を選ぶ。
+    - shortest_queue: 割り当て済みジョブが最も少ないプリンタ（同数なら割り当て回数の少ない方）
+    - round_robin: 条件に合うプリンタを順番に
+    送信が max_failures 回続けて失敗したプリンタは外し、retry_after 秒後に1件だけ試す
+    （成功すれば戻し、失敗すればさらに retry_after 秒外す）。
+    """
+
+    def __init__(
+        self,
+        printers: Sequence[PrinterSpec],
+        policy: str = "shortest_queue",
+        max_failures: int = DEFAULT_PRINTER_MAX_FAILURES,
+        retry_after: float = DEFAULT_PRINTER_RETRY_AFTER,
+    ) -> None:
+        if not printers:
+            raise ValueError("プリンタプールが空です。")
+        if policy not in DISPATCH_POLICIES:
+            raise ValueError(f"未知の割り当て方式です: {policy} ({' / '.join(DISPATCH_POLICIES)})")
+        if max_failures <= 0:
+            raise ValueError("max_failuresは1以上で指定してください。")
+        self.printers = list(printers)
+        self.policy = policy
+        self.max_failures = int(max_failures)
+        self.retry_after = float(retry_after)
+        self._states: Dict[PrinterSpec, _PrinterState] = {
+            printer: _PrinterState(order=index) for index, printer in enumerate(self.printers)
+        }
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["PrinterDispatcher"]:
+        """
+        PHOMEMO_PRINTER_POOL（JSONかJSONファイルのパス）が無ければ None。
+        割り当て方式は PHOMEMO_PRINTER_POOL_POLICY、外すまでの連続失敗回数は PHOMEMO_PRINTER_MAX_FAILURES。
+        """
+        value = os.getenv("PHOMEMO_PRINTER_POOL")
+        if not value:
+            return None
+        return cls(
+            parse_printer_pool(value),
+            policy=os.getenv("PHOMEMO_PRINTER_POOL_POLICY", "shortest_queue"),
+            max_failures=int(os.getenv("PHOMEMO_PRINTER_MAX_FAILURES", DEFAULT_PRINTER_MAX_FAILURES)),
+        )
+
+    def acquire(self, tags: Iterable[str] = ()) -> PrinterSpec:
+        """送り先を選んで割り当てる。終わったら必ず release を呼ぶ。"""
+        required = set(tags)
+        with self._lock:
+            now = time.monotonic()
+            candidates = [
+                printer
+                for printer in self.printers
+                if required.issubset(printer.tags) and self._available(self._states[printer], now)
+            ]
+            if not candidates:
+                detail = f"（タグ: {', '.join(sorted(required))}）" if required else ""
+                raise ValueError(f"割り当てられるプリンタがありません{detail}。")
+            if self.policy == "round_robin":
+                printer = min(
+                    candidates,
+                    key=lambda p: (self._states[p].order - self._next) % len(self.printers),
+                )
+                self._next = (self._states[printer].order + 1) % len(self.printers)
+            else:
+                printer = min(
+                    candidates,
+                    key=lambda p: (self._states[p].queued, self._states[p].dispatched, self._states[p].order),
+                )
+            state = self._states[printer]
+            state.queued += 1
+            state.dispatched += 1
+            if state.unhealthy_since is not None:
+                # 外している間の試し送り: 結果が出るまで次の試しは行わない
+                state.unhealthy_since = now
+            return printer
+
+    def release(
+        self,
+        printer: PrinterSpec,
+        transmitted: Optional[bool] = None,
+        nbytes: int = 0,
+        seconds: float = 0.0,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        割り当てを終える。transmitted: True=送信成功 / False=送信失敗 / None=送信していない
+        （取り消しや合成の失敗はプリンタのせいではないので数えない）。
+        """
+        with self._lock:
+            state = self._states[printer]
+            state.queued = max(0, state.queued - 1)
+            if transmitted is None:
+                return
+            if transmitted:
+                state.jobs_done += 1
+                state.consecutive_failures = 0
+                state.unhealthy_since = None
+                state.bytes_sent += int(nbytes)
+                state.busy_sec += float(seconds)
+                return
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.last_error = error
+            if state.consecutive_failures >= self.max_failures:
+                state.unhealthy_since = time.monotonic()
+
+    def is_available(self, printer: PrinterSpec) -> bool:
+        with self._lock:
+            return self._available(self._states[printer], time.monotonic())
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """外したプリンタ（name 省略時は全て）を稼働中に戻す。"""
+        with self._lock:
+            for printer, state in self._states.items():
+                if name is None or printer.name == name:
+                    state.consecutive_failures = 0
+                    state.unhealthy_since = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            printers = []
+            for printer in self.printers:
+                state = self._states[printer]
+                printers.append(
+                    {
+                        # MACアドレス本体は返さない
+                        "name": printer.name,
+                        "channel": printer.channel,
+                        "tags": list(printer.tags),
+                        "healthy": state.unhealthy_since is None,
+                        "available": self._available(state, now),
+                        "queue_depth": state.queued,
+                        "dispatched": state.dispatched,
+                        "jobs_done": state.jobs_done,
+                        "failures": state.failures,
+                        "consecutive_failures": state.consecutive_failures,
+                        "last_error": state.last_error,
+                        "bytes_sent": state.bytes_sent,
+                        "busy_sec": round(state.busy_sec, 3),
+                        "bytes_per_sec": round(state.bytes_sent / state.busy_sec, 1) if state.busy_sec > 0 else None,
+                    }
+                )
+        return {"policy": self.policy, "max_failures": self.max_failures, "printers": printers}
+
+    def _available(self, state: _PrinterState, now: float) -> bool:
+        if state.unhealthy_since is None:
+            return True
+        return now - state.unhealthy_since >= self.retry_after
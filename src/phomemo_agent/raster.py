@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from phomemo_printer.ESCPOS_constants import GSV0
+
+from .constants import CANVAS_WIDTH
+
+# ESC J n: n ドット紙送り
+FEED_DOTS = b"\x1b\x4a"
+# mode "1" の tobytes() は 1=白 で詰められるため、ビット反転して 1=黒 にする。
+# 0x0A は単独で改行として解釈されてしまうため 0x14 に置き換える（phomemo_printer 互換）。
+_INVERT_TABLE = bytes((~value) & 0xFF for value in range(256))
+_SUBSTITUTE_TABLE = bytes(0x14 if value == 0x0A else value for value in range(256))
+_ENCODE_TABLE = _INVERT_TABLE.translate(_SUBSTITUTE_TABLE)
+
+
+def pack_image(image: Image.Image) -> bytes:
+    """
+    mode "1" 画像を 1bit/px (1=黒, MSB先頭) の行連結バイト列に変換する。
+    0x0A の置換は行わない（送信直前に encode_rows で行う）。
+    """
+    if image.mode != "1":
+        image = image.convert("1")
+    return image.tobytes().translate(_INVERT_TABLE)
+
+
+def encode_rows(packed: bytes) -> bytes:
+    """pack_image の結果に 0x0A→0x14 の置換を施し、GS v 0 のデータ部にする。"""
+    return packed.translate(_SUBSTITUTE_TABLE)
+
+
+def encode_image(image: Image.Image) -> bytes:
+    """mode "1" 画像を GS v 0 のデータ部（置換済み）へ一括変換する。"""
+    if image.mode != "1":
+        image = image.convert("1")
+    return image.tobytes().translate(_ENCODE_TABLE)
+
+
+@dataclass(frozen=True)
+class PackedRaster:
+    """印刷用の2値ラスタ（pack_image の形式: 1=黒, MSB先頭, 0x0A置換なし）。"""
+
+    width: int
+    height: int
+    data: bytes
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> "PackedRaster":
+        return cls(image.width, image.height, pack_image(image))
+
+    def to_image(self) -> Image.Image:
+        return Image.frombytes("1", (self.width, self.height), self.data.translate(_INVERT_TABLE))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    def split(self, max_height: int) -> List["PackedRaster"]:
+        """max_height 行ごとに分ける（slice_image の PackedRaster 版。画像に戻さずに送信できる）。"""
+        if max_height <= 0 or self.height <= max_height:
+            return [self]
+        row_bytes = self.width // 8
+        return [
+            PackedRaster(
+                self.width,
+                min(max_height, self.height - top),
+                self.data[top * row_bytes : (top + max_height) * row_bytes],
+            )
+            for top in range(0, self.height, max_height)
+        ]
+
+
+def block_marker(width_bytes: int, block_height: int) -> bytes:
+    return GSV0 + bytes([width_bytes]) + b"\x00" + bytes([block_height - 1]) + b"\x00"
+
+
+def feed_command(rows: int) -> bytes:
+    """ESC J n（n ドット紙送り）。n は最大255なので、長い空白は分割する。"""
+    commands = bytearray()
+    while rows > 0:
+        step = min(rows, 255)
+        commands += FEED_DOTS + bytes([step])
+        rows -= step
+    return bytes(commands)
+
+
+def _check_slice(image: Union[Image.Image, PackedRaster], chunk_rows: int) -> None:
+    if image.width != CANVAS_WIDTH:
+        raise ValueError(f"画像幅は{CANVAS_WIDTH}pxである必要があります。")
+    if chunk_rows <= 0 or chunk_rows > 256:
+        raise ValueError("chunk_rowsは1-256で指定してください。")
+
+
+def _iter_row_blocks(
+    payload: bytes,
+    width_bytes: int,
+    start_row: int,
+    stop_row: int,
+    chunk_rows: int,
+) -> Iterator[Tuple[bytes, bytes]]:
+    for block_start in range(start_row, stop_row, chunk_rows):
+        block_height = min(chunk_rows, stop_row - block_start)
+        start = block_start * width_bytes
+        yield (
+            block_marker(width_bytes, block_height),
+            payload[start : start + block_height * width_bytes],
+        )
+
+
+def iter_blocks(image: Image.Image, chunk_rows: int) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    スライス画像を chunk_rows 行ごとのブロックに分け、(ブロックマーカー, 行データ) を返す。
+    """
+    _check_slice(image, chunk_rows)
+    width_bytes = image.width // 8
+    yield from _iter_row_blocks(encode_image(image), width_bytes, 0, image.height, chunk_rows)
+
+
+def blank_runs(payload: bytes, width_bytes: int, min_rows: int) -> List[Tuple[int, int]]:
+    """
+    全て白の行が min_rows 行以上続く区間 [start, stop) を返す。
+    0x00 は 0x0A 置換の影響を受けないため、置換済みデータでも判定できる。
+    """
+    rows = np.frombuffer(payload, dtype=np.uint8).reshape(-1, width_bytes)
+    blank = np.concatenate(([False], ~rows.any(axis=1), [False]))
+    edges = np.flatnonzero(np.diff(blank.astype(np.int8)))
+    return [
+        (int(start), int(stop))
+        for start, stop in zip(edges[0::2], edges[1::2])
+        if stop - start >= min_rows
+    ]
+
+
+def iter_slice_commands(
+    image: Image.Image,
+    chunk_rows: int,
+    min_blank_rows: int = 0,
+) -> Iterator[bytes]:
+    """
+    スライス画像を送信用のバイト列（ブロックマーカー/行データ/紙送り）として順に返す。
+    min_blank_rows>0 のとき、その行数以上続く白行は GS v 0 の代わりに ESC J の紙送りで送る。
+    """
+    _check_slice(image, chunk_rows)
+    yield from _iter_payload_commands(
+        encode_image(image), image.width // 8, image.height, chunk_rows, min_blank_rows
+    )
+
+
+def iter_packed_commands(
+    raster: PackedRaster,
+    chunk_rows: int,
+    min_blank_rows: int = 0,
+) -> Iterator[bytes]:
+    """iter_slice_commands の PackedRaster 版（ワーカープロセスから受け取ったラスタをそのまま送る）。"""
+    _check_slice(raster, chunk_rows)
+    yield from _iter_payload_commands(
+        encode_rows(raster.data), raster.width // 8, raster.height, chunk_rows, min_blank_rows
+    )
+
+
+def _iter_payload_commands(
+    payload: bytes,
+    width_bytes: int,
+    height: int,
+    chunk_rows: int,
+    min_blank_rows: int,
+) -> Iterator[bytes]:
+    runs = blank_runs(payload, width_bytes, min_blank_rows) if min_blank_rows > 0 else []
+
+    row = 0
+    for blank_start, blank_stop in [*runs, (height, height)]:
+        for marker, rows in _iter_row_blocks(payload, width_bytes, row, blank_start, chunk_rows):
+            yield marker
+            yield rows
+        if blank_stop > blank_start:
+            yield feed_command(blank_stop - blank_start)
+        row = blank_stop
+
+
+def raster_size(height: int, chunk_rows: int, width_bytes: int = CANVAS_WIDTH // 8) -> int:
+    """紙送り置換をしない場合のスライスの送信バイト数（マーカー + 行データ）。"""
+    blocks = -(-height // chunk_rows)
+    return blocks * len(block_marker(width_bytes, 1)) + height * width_bytes
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cache import LRUCache
+from .constants import DEFAULT_RENDER_CACHE_BYTES, DEFAULT_RENDER_CACHE_DISK_BYTES
+from .raster import PackedRaster
+
+# キャッシュの形式や描画結果が変わる修正を入れたら上げる（古いエントリを無効にする）
+RENDER_CACHE_VERSION = 1
+
+# 2値ラスタに影響しない出力設定（送信方法・プレビュー・保存先）。キーから除いてヒットしやすくする
+_TRANSMIT_ONLY_OUTPUT_KEYS = frozenset(
+    {
+        "path",
+        "send_to_printer",
+        "slice_height",
+        "chunk_rows",
+        "write_buffer_size",
+        "write_interval",
+        "feed_blank_rows",
+        "streaming",
+        "preview",
+        "preview_width",
+        "preview_async",
+        "cache",
+    }
+)
+
+_DISK_MAGIC = b"PHR1"
+_DISK_HEADER = struct.Struct(">4sII")
+
+
+def referenced_files(config: Dict) -> List[str]:
+    """ジョブが参照するフォント・画像・テキストファイルのパス。"""
+    canvas_cfg = config.get("canvas", {})
+    paths = [canvas_cfg.get("font_path"), *canvas_cfg.get("fallback_fonts", [])]
+    for layer in config.get("layers", []):
+        paths += [layer.get("font_path"), *layer.get("fallback_fonts", [])]
+        paths += [layer.get("path"), layer.get("text_file")]
+    return [str(path) for path in paths if path]
+
+
+def _file_signature(path: str) -> Tuple[str, int, int]:
+    # 相対パスは描画時と同じくカレントディレクトリ基準
+    absolute = os.path.abspath(path)
+    try:
+        stat = os.stat(absolute)
+    except OSError:
+        return (absolute, -1, -1)
+    return (absolute, stat.st_mtime_ns, stat.st_size)
+
+
+def render_cache_key(config: Dict, encoding: str = "utf-8") -> str:
+    """
+    ジョブの正規化JSON（ラスタに影響する部分）と、参照ファイルの mtime/サイズから作るキー。
+    ファイルが更新されればキーが変わるため、古いラスタが使われることはない。
+    """
+    canvas_cfg = {k: v for k, v in config.get("canvas", {}).items() if k != "render_workers"}
+    output_cfg = {
+        k: v for k, v in config.get("output", {}).items() if k not in _TRANSMIT_ONLY_OUTPUT_KEYS
+    }
+    payload = {
+        "version": RENDER_CACHE_VERSION,
+        "encoding": encoding,
+        "canvas": canvas_cfg,
+        "layers": config.get("layers", []),
+        "output": output_cfg,
+        "files": [_file_signature(path) for path in referenced_files(config)],
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    印刷用の2値ラスタ（PackedRaster）をキーごとに保持する。
+    - メモリ: max_bytes を上限とするLRU
+    - ディスク（directory 指定時のみ）: max_disk_bytes を上限に、古く使われたファイルから消す
+    ディスクの読み書きに失敗してもエラーにはせず、キャッシュなしとして扱う。
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_RENDER_CACHE_BYTES,
+        directory: Optional[Path] = None,
+        max_disk_bytes: int = DEFAULT_RENDER_CACHE_DISK_BYTES,
+    ) -> None:
+        self.memory: LRUCache[PackedRaster] = LRUCache(max_bytes=max_bytes, sizeof=lambda r: r.nbytes)
+        self.directory = Path(directory) if directory else None
+        self.max_disk_bytes = int(max_disk_bytes)
+        self.disk_hits = 0
+        self._disk_lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "RenderCache":
+        """PHOMEMO_RENDER_CACHE_DIR / PHOMEMO_RENDER_CACHE_DISK_BYTES からディスクキャッシュを設定する。"""
+        directory = os.getenv("PHOMEMO_RENDER_CACHE_DIR")
+        max_disk_bytes = int(os.getenv("PHOMEMO_RENDER_CACHE_DISK_BYTES", DEFAULT_RENDER_CACHE_DISK_BYTES))
+        return cls(directory=Path(directory) if directory else None, max_disk_bytes=max_disk_bytes)
+
+    def lookup(self, key: str) -> Tuple[Optional[PackedRaster], Optional[str]]:
+        """(ラスタ, 取得元 "memory" | "disk") を返す。無ければ (None, None)。"""
+        raster = self.memory.get(key)
+        if raster is not None:
+            return raster, "memory"
+        raster = self._read_disk(key)
+        if raster is not None:
+            self.disk_hits += 1
+            self.memory.put(key, raster)
+            return raster, "disk"
+        return None, None
+
+    def store(self, key: str, raster: PackedRaster) -> None:
+        self.memory.put(key, raster)
+        self._write_disk(key, raster)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.directory is None:
+            return
+        with self._disk_lock:
+            for path in self.directory.glob("*.raster"):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        stats = {"memory": self.memory.stats(), "disk": None}
+        if self.directory is not None:
+            with self._disk_lock:
+                files = list(self._disk_files())
+            stats["disk"] = {
+                "files": len(files),
+                "bytes": sum(size for _, size, _ in files),
+                "max_bytes": self.max_disk_bytes,
+                "hits": self.disk_hits,
+            }
+        return stats
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.raster"
+
+    def _read_disk(self, key: str) -> Optional[PackedRaster]:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            blob = path.read_bytes()
+            magic, width, height = _DISK_HEADER.unpack_from(blob)
+            if magic != _DISK_MAGIC:
+                return None
+            # 最終使用時刻として mtime を更新する（容量超過時の削除順に使う）
+            os.utime(path)
+        except (OSError, struct.error):
+            return None
+        return PackedRaster(width, height, blob[_DISK_HEADER.size :])
+
+    def _write_disk(self, key: str, raster: PackedRaster) -> None:
+        if self.directory is None:
+            return
+        blob = _DISK_HEADER.pack(_DISK_MAGIC, raster.width, raster.height) + raster.data
+        if len(blob) > self.max_disk_bytes:
+            return
+        with self._disk_lock:
+            try:
+                fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "wb") as tmp:
+                    tmp.write(blob)
+                os.replace(tmp_name, self._path(key))
+            except OSError:
+                return
+            self._trim_disk()
+
+    def _disk_files(self):
+        for path in self.directory.glob("*.raster"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime_ns
+
+    def _trim_disk(self) -> None:
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
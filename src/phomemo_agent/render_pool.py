@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .composer import build_font, job_fonts
+from .constants import DEFAULT_SLICE_HEIGHT
+from .pipeline import LayoutJobPipeline, PreparedJob, ProgressCallback
+from .raster import PackedRaster
+from .render_cache import RenderCache
+from .timing import JobTimings
+
+# ワーカープロセス内のパイプライン（_init_worker で作る）
+_worker_pipeline: Optional[LayoutJobPipeline] = None
+
+
+def _init_worker(warm_fonts: Sequence[str], warm_jobs: Sequence[Dict]) -> None:
+    """
+    スキーマとフォントを読み込んでおき、最初のジョブで待たないようにする。
+    フォントのキャッシュはフォールバックと絵文字の設定ごとなので、warm_jobs のジョブが使う組み合わせで読み込む
+    （warm_fonts はフォールバック・絵文字の設定なしの組み合わせ）。
+    """
+    global _worker_pipeline
+    _worker_pipeline = LayoutJobPipeline(render_cache=RenderCache.from_env())
+    for font_path in warm_fonts:
+        build_font(font_path, [], {})
+    for config in warm_jobs:
+        for font_path, fallback_fonts, emoji_cfg in job_fonts(config):
+            build_font(font_path, fallback_fonts, emoji_cfg)
+
+
+def _worker_ready(hold_sec: float) -> int:
+    # 少し待って、他のワーカーにも確認のタスクが行き渡るようにする
+    time.sleep(hold_sec)
+    return os.getpid()
+
+
+def _render_in_worker(
+    config: Dict,
+    base_dir: Optional[str],
+    encoding: str,
+    dry_run: bool,
+    validate: bool,
+    segment: str,
+) -> Dict:
+    """
+    検証・合成・2値化・プレビュー保存までを行い、印刷用ラスタ（1bit/px）を segment という名前の
+    共有メモリに置いて、寸法・計測値だけを返す（PIL画像はプロセス間で受け渡さない）。
+    共有メモリの解放は親プロセスが受け持つ（_take_raster / _unlink_segment）。
+    """
+    pipeline = _worker_pipeline
+    job = pipeline.prepare_config(
+        config,
+        base_dir=Path(base_dir) if base_dir else None,
+        encoding=encoding,
+        dry_run=dry_run,
+        validate=validate,
+    )
+    if job.image is None:
+        raise ValueError("ストリーミングのジョブはワーカープロセスでは合成できません。")
+    if job.preview_future is not None:
+        job.preview_future.result()
+
+    raster = PackedRaster.from_image(job.image)
+    shm = SharedMemory(name=segment, create=True, size=max(1, raster.nbytes))
+    try:
+        shm.buf[: raster.nbytes] = raster.data
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return {
+        "width": raster.width,
+        "height": raster.height,
+        "nbytes": raster.nbytes,
+        "send_to_printer": job.send_to_printer,
+        "streaming": job.streaming,
+        "color_mode": job.color_mode,
+        "preview_path": str(job.preview_path) if job.preview_path is not None else None,
+        "cache_key": job.cache_key,
+        "cache_hit": job.cache_hit,
+        "cache_source": job.cache_source,
+        "stages": job.timings.stages,
+        "layers": job.timings.layers,
+    }
+
+
+def _unlink_segment(name: str) -> None:
+    """ワーカーが作った共有メモリが残っていれば解放する。"""
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _take_raster(name: str, width: int, height: int, nbytes: int) -> PackedRaster:
+    """ワーカーが置いたラスタを共有メモリから取り出し、共有メモリは解放する。"""
+    shm = SharedMemory(name=name)
+    try:
+        data = bytes(shm.buf[:nbytes])
+    finally:
+        shm.close()
+        shm.unlink()
+    return PackedRaster(width, height, data)
+
+
+class ProcessRenderPool:
+    """
+    prepare_config（検証・合成・2値化・プレビュー保存）をワーカープロセスで行う。
+    GILに縛られずにコア数だけ並列に合成でき、親プロセスは送信だけを受け持つ。
+    - ワーカーは spawn で起動し、起動時にスキーマと warm_fonts / warm_jobs のフォントを読み込む
+    - ジョブはパース済みのdictで渡し、結果は共有メモリ上の1bitラスタで受け取る
+    - 印刷用ラスタのキャッシュはワーカーごと（PHOMEMO_RENDER_CACHE_DIR のディスクキャッシュは共有）
+    """
+
+    def __init__(self, workers: int, warm_fonts: Sequence[str] = (), warm_jobs: Sequence[Dict] = ()) -> None:
+        if workers <= 0:
+            raise ValueError("workersは1以上で指定してください。")
+        self.workers = int(workers)
+        self.warm_fonts = [str(path) for path in warm_fonts]
+        self.warm_jobs = list(warm_jobs)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # スレッドを持つ常駐プロセスからの fork は安全でないため spawn にする
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.warm_fonts, self.warm_jobs),
+        )
+
+    def warm(self, timeout: float = 60.0) -> List[int]:
+        """全ワーカーを起動して初期化を済ませる（timeout 秒まで待つ）。初期化済みワーカーのPIDを返す。"""
+        deadline = time.monotonic() + timeout
+        pids: set[int] = set()
+        while len(pids) < self.workers and time.monotonic() < deadline:
+            futures = [self._executor.submit(_worker_ready, 0.05) for _ in range(self.workers)]
+            wait(futures)
+            pids.update(future.result() for future in futures)
+        return sorted(pids)
+
+    def prepare(
+        self,
+        config: Dict,
+        base_dir: Optional[Path],
+        encoding: str,
+        dry_run: bool,
+        validate: bool,
+        report: ProgressCallback,
+        timings: JobTimings,
+    ) -> PreparedJob:
+        """
+        LayoutJobPipeline.prepare_config と同じ結果をワーカーで作る（進捗の通知は送信から）。
+        ストリーミングのジョブは全体のラスタを作ってしまいメモリの上限が守れないため受け付けない
+        （LayoutJobPipeline はプロセス内で合成する）。
+        """
+        if config.get("output", {}).get("streaming", False):
+            raise ValueError("ストリーミングのジョブはワーカープロセスでは合成できません。")
+        started = time.perf_counter()
+        # 共有メモリの名前は親が決めて渡し、受け取れなかった場合も親が解放する
+        segment = f"phomemo_{os.getpid()}_{uuid.uuid4().hex[:12]}"
+        future = self._executor.submit(
+            _render_in_worker,
+            config,
+            str(base_dir) if base_dir is not None else None,
+            encoding,
+            dry_run,
+            validate,
+            segment,
+        )
+        try:
+            result = future.result()
+            raster = _take_raster(segment, result["width"], result["height"], result["nbytes"])
+        except BaseException:
+            # 待っている間に中断された・結果の受け取りに失敗した場合も、ワーカーが作った
+            # （これから作る）共有メモリを /dev/shm に残さない。終わっていれば今すぐ解放される
+            future.add_done_callback(lambda _: _unlink_segment(segment))
+            raise
+
+        # ワーカーでの計測値を取り込み、待ち時間（キュー待ち + プロセス間の受け渡し）も記録する
+        for name, record in result["stages"].items():
+            timings.add_stage(name, record["wall_sec"], record["cpu_sec"])
+        for record in result["layers"]:
+            record = dict(record)
+            timings.add_layer(record.pop("index"), record.pop("type"), record)
+        timings.add_stage("render_process", time.perf_counter() - started, 0.0)
+
+        output_cfg = config.get("output", {})
+        preview_path = result["preview_path"]
+        return PreparedJob(
+            output_cfg=output_cfg,
+            dry_run=bool(dry_run),
+            send_to_printer=result["send_to_printer"],
+            # 画像に戻さず、1bitのラスタのままスライスして送る
+            slices=raster.split(output_cfg.get("slice_height", DEFAULT_SLICE_HEIGHT)),
+            width=raster.width,
+            height=raster.height,
+            streaming=result["streaming"],
+            color_mode=result["color_mode"],
+            preview_path=Path(preview_path) if preview_path is not None else None,
+            preview_future=None,
+            preview_image=None,
+            cache_key=result["cache_key"],
+            cache_hit=result["cache_hit"],
+            cache_source=result["cache_source"],
+            timings=timings,
+            report=report,
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
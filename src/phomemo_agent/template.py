@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from PIL import Image
+
+from .batch import fill_template, template_fields
+from .composer import (
+    CanvasPlan,
+    RenderedLayer,
+    _is_monochrome_job,
+    as_mono,
+    build_plan,
+    canvas_defaults,
+    hex_to_rgba,
+    paste_layers,
+    prepare_canvas,
+    render_layers,
+)
+from .constants import CANVAS_WIDTH
+
+
+def is_variable_layer(layer: Dict) -> bool:
+    """"variable": true、または文字列に {{field}} を含むレイヤー。"""
+    return bool(layer.get("variable")) or bool(template_fields(layer))
+
+
+class CompiledTemplate:
+    """
+    レイアウトの静的レイヤーを先に描画しておき、ジョブごとに可変レイヤーだけを描画する。
+    最初の可変レイヤーより前の静的レイヤーは下地画像に合成済みで、合成時はそれを写すだけになる
+    （重なり順を保つため、それより後ろの静的レイヤーは描画済みの画像を毎回重ねる）。
+    静的レイヤーが参照するフォント・画像はコンパイル時点の内容が使われる。
+    """
+
+    def __init__(self, template: Dict, encoding: str = "utf-8", workers: Optional[int] = None):
+        canvas_cfg = template.get("canvas", {})
+        layers = template.get("layers", [])
+        if not layers:
+            raise ValueError("layers が空です")
+        self.template = template
+        self.encoding = encoding
+        self.workers = int(canvas_cfg.get("render_workers", workers or 1))
+
+        if template_fields(canvas_cfg):
+            # canvas の設定が差し込みで変わるなら、どのレイヤーも使い回せない
+            self.variable = [True] * len(layers)
+            self.global_defaults: Optional[Dict] = None
+        else:
+            self.variable = [is_variable_layer(layer) for layer in layers]
+            self.global_defaults = canvas_defaults(canvas_cfg)
+
+        static = [index for index, variable in enumerate(self.variable) if not variable]
+        rendered = (
+            render_layers([layers[index] for index in static], self.global_defaults, encoding, self.workers)
+            if static
+            else []
+        )
+        self._static: Dict[int, RenderedLayer] = dict(zip(static, rendered))
+        self.base_layers, self._base = self._build_base(canvas_cfg)
+
+    def _build_base(self, canvas_cfg: Dict) -> Tuple[int, Dict[str, Image.Image]]:
+        base_layers = next((index for index, variable in enumerate(self.variable) if variable), len(self.variable))
+        prefix = [self._static[index] for index in range(base_layers)]
+        height = max((rendered.position[1] + rendered.size[1] for rendered in prefix), default=0)
+        if height <= 0:
+            return 0, {}
+
+        background = hex_to_rgba(canvas_cfg.get("background_color", "#FFFFFF"))
+        plan = CanvasPlan(
+            width=CANVAS_WIDTH,
+            height=height,
+            background=background,
+            layers=prefix,
+            output_cfg={},
+        )
+        base = {"RGBA": paste_layers(plan)}
+        color_mode = str(canvas_cfg.get("color_mode", "auto")).lower()
+        prefix_cfg = self.template["layers"][:base_layers]
+        if color_mode == "mono" or (color_mode == "auto" and _is_monochrome_job(prefix_cfg, background)):
+            # モノクロ合成になりうるジョブは "L" の下地も用意しておく（"LA" で重ねた結果と一致させる）
+            base["L"] = paste_layers(as_mono(plan))
+        return base_layers, base
+
+    def fill(self, row: Mapping[str, Any]) -> Dict:
+        """{{field}} に row の値を差し込んだジョブを返す。"""
+        return fill_template(self.template, row)
+
+    def prepare(self, config: Optional[Dict] = None) -> CanvasPlan:
+        """
+        ジョブ（省略時はテンプレートそのもの）のキャンバスを用意する。prepare_canvas と同じ結果になる。
+        テンプレートと異なる静的レイヤーは描画し直し、canvas が異なる場合は通常の経路で描画する。
+        """
+        if config is None:
+            config = self.template
+        layers = config.get("layers", [])
+        if (
+            self.global_defaults is None
+            or config.get("canvas", {}) != self.template.get("canvas", {})
+            or len(layers) != len(self.variable)
+        ):
+            return prepare_canvas(config, encoding=self.encoding, workers=self.workers)
+
+        template_layers = self.template["layers"]
+        reuse = [index in self._static and layer == template_layers[index] for index, layer in enumerate(layers)]
+        base_layers = self.base_layers if all(reuse[: self.base_layers]) else 0
+        pending = [index for index, reused in enumerate(reuse) if not reused]
+        fresh = dict(
+            zip(
+                pending,
+                render_layers([layers[index] for index in pending], self.global_defaults, self.encoding, self.workers),
+            )
+        )
+        rendered: List[RenderedLayer] = [
+            # 使い回したレイヤーは描画していないので内訳を持たない
+            fresh[index] if index in fresh else replace(self._static[index], timings={})
+            for index in range(len(layers))
+        ]
+        return build_plan(config, rendered, self._base if base_layers else None, base_layers)
+
+    def compose(self, row: Mapping[str, Any]) -> Tuple[Image.Image, Dict]:
+        """compose_canvas と同じく (合成画像, output設定) を返す。"""
+        plan = self.prepare(self.fill(row))
+        return paste_layers(plan), plan.output_cfg
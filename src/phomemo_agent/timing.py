@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# (kind, record): kind は "stage" / "layer" / "slice"。トレーシングへの転送などに使う
+TimingHook = Callable[[str, Dict], None]
+
+
+@contextmanager
+def measure(timings: Dict[str, float], name: str) -> Iterator[None]:
+    """timings[name] に経過秒数（壁時計）を加算する。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+class JobTimings:
+    """
+    1ジョブ分の段階ごとの壁時計/CPU時間、レイヤーごとの描画時間、スライスごとの送信バイト数を集める。
+    段階のCPU時間は time.thread_time（その段階を実行したスレッドの分だけ。先読みで別スレッドの段階が
+    重なっても二重に数えない。並列描画のワーカースレッド分は含まない）。total_cpu_sec はプロセス全体。
+    記録のたびに hooks へ (kind, record) を渡す。フック内の例外はそのまま呼び出し元に伝わる。
+    記録は先読み（送信中の2値化・符号化/合成）のスレッドやプレビュー保存のスレッドからも行われるため、
+    フックは呼び出し元のスレッド（ジョブを処理するスレッドとは限らない）で呼ばれる。
+    同時に呼ばれることはなく、記録の順に1つずつ呼ばれる。
+    """
+
+    def __init__(self, hooks: Sequence[TimingHook] = ()) -> None:
+        self.hooks = list(hooks)
+        self.stages: Dict[str, Dict] = {}
+        self.layers: List[Dict] = []
+        self.slices: List[Dict] = []
+        self._started = (time.perf_counter(), time.process_time())
+        # 記録とフック呼び出しをまとめて守る（フックから記録し直しても固まらないよう RLock）
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def timed_iter(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """
+        ジェネレータの各要素の生成にかかった時間を name の段階として積算する
+        （ストリーミング時のように、合成・2値化が送信と交互に進む場合に使う）。
+        """
+        iterator = iter(items)
+        while True:
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_stage(name, time.perf_counter() - wall, time.thread_time() - cpu)
+            yield item
+
+    def timed_map(self, name: str, func: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+        """func(item) の時間だけを name の段階として積算する（items の生成時間は含めない）。"""
+        for item in items:
+            with self.stage(name):
+                result = func(item)
+            yield result
+
+    def add_stage(self, name: str, wall_sec: float, cpu_sec: float) -> None:
+        with self._lock:
+            record = self.stages.setdefault(name, {"wall_sec": 0.0, "cpu_sec": 0.0})
+            record["wall_sec"] += wall_sec
+            record["cpu_sec"] += cpu_sec
+            self._emit("stage", {"stage": name, "wall_sec": wall_sec, "cpu_sec": cpu_sec})
+
+    def add_layer(self, index: int, layer_type: str, timings: Dict[str, float]) -> None:
+        record = {"index": index, "type": layer_type, **{k: round(v, 6) for k, v in timings.items()}}
+        with self._lock:
+            self.layers.append(record)
+            self._emit("layer", record)
+
+    def add_slice(self, index: int, height: int, nbytes: int) -> None:
+        record = {"index": index, "height": height, "bytes": nbytes}
+        with self._lock:
+            self.slices.append(record)
+            self._emit("slice", record)
+
+    def _emit(self, kind: str, record: Dict) -> None:
+        # _lock を持って呼ぶ
+        for hook in self.hooks:
+            hook(kind, record)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                # ストリーミング時は段階が入れ子になるため、合計は段階の和ではなく開始からの経過で出す
+                "total_wall_sec": round(time.perf_counter() - self._started[0], 6),
+                "total_cpu_sec": round(time.process_time() - self._started[1], 6),
+                "stages": {
+                    name: {key: round(value, 6) for key, value in record.items()}
+                    for name, record in self.stages.items()
+                },
+                "layers": list(self.layers),
+                "slices": list(self.slices),
+            }
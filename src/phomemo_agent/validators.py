@@ -3,29 +3,205 @@ from __future__ import annotations
 import json
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from jsonschema import Draft202012Validator
 
 
 SCHEMA_PATH = Path(__file__).resolve().parents[2] / "schemas" / "layout_job.schema.json"
 
+VALIDATION_MODES = ("compiled", "full")
+
+Check = Callable[[Any], bool]
+
+_TYPE_CHECKS: Dict[str, Check] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+    # JSON Schema では bool は数値ではない。整数値の float は integer として扱う
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "integer": lambda value: (
+        isinstance(value, int) and not isinstance(value, bool)
+        or isinstance(value, float) and value.is_integer()
+    ),
+}
+
+# 注釈のみでバリデーションに影響しないキーワード
+_ANNOTATIONS = {"$schema", "$id", "title", "description", "$comment", "examples", "default"}
+
+
+class _Unsupported(Exception):
+    """コンパイルできないキーワードを含むスキーマ（常に jsonschema で検証する）。"""
+
+
+def _is_number(value: Any) -> bool:
+    return _TYPE_CHECKS["number"](value)
+
+
+def _compile(schema: Any) -> Check:
+    """
+    スキーマ（このリポジトリで使うキーワードのサブセット）を、真偽だけを返す関数に変換する。
+    エラーの内容は作らないため、妥当な入力を素早く通すことだけに使う。
+    """
+    if schema is True:
+        return lambda value: True
+    if schema is False:
+        return lambda value: False
+    if not isinstance(schema, dict):
+        raise _Unsupported(repr(schema))
+
+    checks: List[Check] = []
+    for keyword, argument in schema.items():
+        if keyword in _ANNOTATIONS or keyword in ("then", "else"):
+            continue
+        checks.append(_compile_keyword(keyword, argument, schema))
+
+    if not checks:
+        return lambda value: True
+    if len(checks) == 1:
+        return checks[0]
+    return lambda value: all(check(value) for check in checks)
+
+
+def _compile_keyword(keyword: str, argument: Any, schema: Dict) -> Check:
+    if keyword == "type":
+        names = argument if isinstance(argument, list) else [argument]
+        if any(name not in _TYPE_CHECKS for name in names):
+            raise _Unsupported(f"type={argument}")
+        type_checks = [_TYPE_CHECKS[name] for name in names]
+        return lambda value: any(check(value) for check in type_checks)
+
+    if keyword == "enum":
+        options = list(argument)
+        return lambda value: any(_json_equal(value, option) for option in options)
+    if keyword == "const":
+        return lambda value: _json_equal(value, argument)
+
+    if keyword == "required":
+        names = tuple(argument)
+        return lambda value: not isinstance(value, dict) or all(name in value for name in names)
+
+    if keyword == "properties":
+        compiled = {name: _compile(sub) for name, sub in argument.items()}
+        return lambda value: not isinstance(value, dict) or all(
+            check(value[name]) for name, check in compiled.items() if name in value
+        )
+
+    if keyword == "additionalProperties":
+        if "patternProperties" in schema:
+            raise _Unsupported("patternProperties")
+        known = frozenset(schema.get("properties", {}))
+        extra = _compile(argument)
+        return lambda value: not isinstance(value, dict) or all(
+            extra(item) for name, item in value.items() if name not in known
+        )
+
+    if keyword == "items":
+        item_check = _compile(argument)
+        return lambda value: not isinstance(value, list) or all(item_check(item) for item in value)
+
+    if keyword == "minItems":
+        return lambda value: not isinstance(value, list) or len(value) >= argument
+    if keyword == "maxItems":
+        return lambda value: not isinstance(value, list) or len(value) <= argument
+    if keyword == "minLength":
+        # JSON Schema の長さはコードポイント数（Python の len と同じ）
+        return lambda value: not isinstance(value, str) or len(value) >= argument
+    if keyword == "maxLength":
+        return lambda value: not isinstance(value, str) or len(value) <= argument
+
+    if keyword == "minimum":
+        return lambda value: not _is_number(value) or value >= argument
+    if keyword == "maximum":
+        return lambda value: not _is_number(value) or value <= argument
+    if keyword == "exclusiveMinimum":
+        return lambda value: not _is_number(value) or value > argument
+    if keyword == "exclusiveMaximum":
+        return lambda value: not _is_number(value) or value < argument
+
+    if keyword == "allOf":
+        compiled_all = [_compile(sub) for sub in argument]
+        return lambda value: all(check(value) for check in compiled_all)
+    if keyword == "anyOf":
+        compiled_any = [_compile(sub) for sub in argument]
+        return lambda value: any(check(value) for check in compiled_any)
+
+    if keyword == "if":
+        condition = _compile(argument)
+        then = _compile(schema.get("then", True))
+        otherwise = _compile(schema.get("else", True))
+        return lambda value: then(value) if condition(value) else otherwise(value)
+
+    raise _Unsupported(keyword)
+
+
+def _json_equal(value: Any, expected: Any) -> bool:
+    # JSON では true と 1 は別の値
+    if isinstance(value, bool) or isinstance(expected, bool):
+        return isinstance(value, bool) and isinstance(expected, bool) and value == expected
+    return value == expected
+
+
+@lru_cache(maxsize=8)
+def _load_schema(schema_path: str, mtime_ns: int) -> Tuple[Draft202012Validator, Optional[Check]]:
+    """
+    スキーマを読み込み、jsonschema のバリデータと高速チェック関数を作る（ファイル更新でキーが変わる）。
+    コンパイルできないキーワードがあれば高速チェックは None（常に jsonschema を使う）。
+    """
+    schema = json.loads(Path(schema_path).read_text(encoding="utf-8"))
+    try:
+        fast_check: Optional[Check] = _compile(schema)
+    except _Unsupported:
+        fast_check = None
+    return Draft202012Validator(schema), fast_check
+
 
 class LayoutJobValidator:
-    def __init__(self, schema_path: Path | None = None) -> None:
-        self.schema_path = schema_path or SCHEMA_PATH
-        self._validator = self._load_validator()
+    """
+    mode:
+      - "compiled"（既定）: スキーマを高速チェック関数にコンパイルして使う。妥当な入力はそこで即座に通し、
+        不正な場合だけ jsonschema で全エラーを集める
+      - "full": 毎回 jsonschema で全エラーを集める（従来の動作）
+    検証結果はキャッシュしない（キーにするためのジョブ全体のシリアライズとハッシュが、高速チェックと同程度か、
+    長いテキストを含むジョブではそれ以上にかかるため。python -m phomemo_agent.benchmarks.validation で確認できる）。
+    """
 
-    @lru_cache(maxsize=1)
-    def _load_validator(self) -> Draft202012Validator:
-        schema = json.loads(self.schema_path.read_text(encoding="utf-8"))
-        return Draft202012Validator(schema)
+    def __init__(
+        self,
+        schema_path: Path | None = None,
+        mode: str = "compiled",
+    ) -> None:
+        if mode not in VALIDATION_MODES:
+            raise ValueError(f"未知の検証モードです: {mode} ({' / '.join(VALIDATION_MODES)})")
+        self.schema_path = schema_path or SCHEMA_PATH
+        self.mode = mode
+        resolved = self.schema_path.resolve()
+        self._validator, self._fast_check = _load_schema(str(resolved), resolved.stat().st_mtime_ns)
 
     def validate(self, config: Dict) -> None:
+        if self.mode == "compiled" and self._fast_check is not None and self._fast_check(config):
+            return
+        self._raise_errors(config)
+
+    def _raise_errors(self, config: Dict) -> None:
+        message = self._error_message(config)
+        if message:
+            raise ValueError(message)
+
+    def _error_message(self, config: Dict) -> str:
         errors = sorted(self._validator.iter_errors(config), key=lambda e: e.path)
-        if errors:
-            formatted = "\n".join(
-                f"- {'/'.join(map(str, err.absolute_path)) or '(root)'}: {err.message}"
-                for err in errors
-            )
-            raise ValueError(f"layout job schema validation failed:\n{formatted}")
+        if not errors:
+            return ""
+        formatted = "\n".join(
+            f"- {'/'.join(map(str, err.absolute_path)) or '(root)'}: {err.message}"
+            for err in errors
+        )
+        return f"layout job schema validation failed:\n{formatted}"
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "compiled": self._fast_check is not None,
+        }